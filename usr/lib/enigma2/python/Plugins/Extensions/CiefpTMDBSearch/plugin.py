@@ -4,12 +4,23 @@ from __future__ import print_function
 import os
 import re
 import json
+import hashlib
+import struct
 import ssl
-import urllib.request
+import socket
+import gzip
+import zlib
+import http.client
 import urllib.parse
+import urllib.request
 import threading
+import heapq
+import itertools
 import time
+import email.utils
+import shutil
 from io import BytesIO
+from collections import OrderedDict
 
 # Enigma2 imports
 from Components.ScrollLabel import ScrollLabel
@@ -24,9 +35,14 @@ from Screens.Screen import Screen
 from Screens.VirtualKeyBoard import VirtualKeyBoard
 from Screens.MessageBox import MessageBox
 from Screens.ChoiceBox import ChoiceBox
-from enigma import eTimer, eServiceCenter, iServiceInformation, eEPGCache, eConsoleAppContainer, eSize, ePoint
+from enigma import eTimer, eServiceCenter, iServiceInformation, eEPGCache, eConsoleAppContainer, eSize, ePoint, eSocketNotifier
 from Tools.LoadPixmap import LoadPixmap
 
+try:
+    from PIL import Image  # opciono - bez njega se slike prikazuju u originalnoj veličini
+except ImportError:
+    Image = None
+
 # ---------- CONFIG ----------
 config.plugins.ciefptmdb = ConfigSubsection()
 config.plugins.ciefptmdb.tmdb_api_key = ConfigText(default="", fixed_size=False)
@@ -37,6 +53,32 @@ config.plugins.ciefptmdb.cache_folder = ConfigSelection(default="/tmp/CiefpTMDBS
     ("/usr/lib/enigma2/python/Plugins/Extensions/CiefpTMDBSearch/", "Plugin folder")
 ])
 config.plugins.ciefptmdb.cache_enabled = ConfigYesNo(default=True)
+# Gornja granica za slike u cache folderu (MB); /tmp je RAM na većini risivera
+CACHE_SIZE_CHOICES = ["20", "50", "100", "250", "500"]
+config.plugins.ciefptmdb.cache_max_size = ConfigSelection(default="50", choices=[(size, f"{size} MB") for size in CACHE_SIZE_CHOICES])
+# Na sporoj vezi prvo stiže manja slika; sa ovim se posle zameni punom
+config.plugins.ciefptmdb.image_upgrade = ConfigYesNo(default=False)
+# Backdrop/galerija: prvo mali pregled (w300/w185), pa puna slika
+config.plugins.ciefptmdb.progressive_images = ConfigYesNo(default=True)
+# Trajni (hladni) nivo keša na disku; cache_folder ostaje brzi radni nivo
+COLD_CACHE_CHOICES = ["none", "/media/hdd/CiefpTMDBSearch/", "/media/usb/CiefpTMDBSearch/"]
+config.plugins.ciefptmdb.cold_cache_folder = ConfigSelection(default="none", choices=[
+    (folder, "Disabled" if folder == "none" else folder) for folder in COLD_CACHE_CHOICES
+])
+COLD_CACHE_MAX_MB = 1000
+# Koliko narednih EPG emisija kanala koji se gleda se unapred razrešava ("0" = isključeno)
+EPG_PREFETCH_CHOICES = ["0", "1", "3", "5"]
+config.plugins.ciefptmdb.epg_prefetch = ConfigSelection(default="3", choices=[
+    (count, "Off" if count == "0" else count) for count in EPG_PREFETCH_CHOICES
+])
+# Pozadinski indekser bukea (isključen dok ga korisnik ne uključi) i mrežni zahtevi po prolazu.
+# Najviše jedan posao: druga nit download_pool-a uvek ostaje za interaktivne zahteve
+INDEX_WORKER_CHOICES = ["0", "1"]
+config.plugins.ciefptmdb.index_workers = ConfigSelection(default="0", choices=[
+    (count, "Off" if count == "0" else "On") for count in INDEX_WORKER_CHOICES
+])
+INDEX_BUDGET_CHOICES = ["100", "250", "500", "1000"]
+config.plugins.ciefptmdb.index_budget = ConfigSelection(default="250", choices=[(budget, budget) for budget in INDEX_BUDGET_CHOICES])
 config.plugins.ciefptmdb.language = ConfigSelection(default="en-US", choices=[
     ("en-US", "English"),
     ("sr-RS", "Srpski"),
@@ -190,6 +232,93 @@ def get_current_epg_event():
         print(f"[TMDB] EPG lookup error: {e}")
         return None
 
+
+def get_upcoming_epg_events(count, service=None):
+    """Narednih `count` EPG događaja (bez trenutnog) kao lista dict-ova"""
+    service = service or get_current_service()
+    if not service:
+        return []
+    try:
+        # B=početak, T=naslov, S=kratak, E=opširan opis; -1 = od sada, narednih 24h
+        events = eEPGCache.getInstance().lookupEvent(["BTSE", (service.toString(), 0, -1, 24 * 60)]) or []
+    except Exception as e:
+        print(f"[TMDB] EPG lookahead error: {e}")
+        return []
+    upcoming = []
+    for event in events[1:count + 1]:  # prvi je događaj koji je trenutno u toku
+        if not event or len(event) < 4:
+            continue
+        upcoming.append({
+            'begin': event[0] or 0,
+            'name': str(event[1] or ''),
+            'short': str(event[2] or ''),
+            'ext': str(event[3] or '')
+        })
+    return upcoming
+
+
+def get_bouquet_services():
+    """Servisi (ref) trenutnog bukea, bez markera i foldera"""
+    try:
+        from Screens.InfoBar import InfoBar
+        servicelist = InfoBar.instance.servicelist if InfoBar.instance else None
+        root = servicelist.getRoot() if servicelist else None
+        if root is None:
+            return []
+        services = eServiceCenter.getInstance().list(root)
+        if services is None:
+            return []
+        # "R" = eServiceReference, True = po redosledu iz bukea
+        return [ref for ref in services.getContent("R", True) if not ref.flags & (ref.isMarker | ref.isDirectory)]
+    except Exception as e:
+        print(f"[TMDB] Bouquet lookup error: {e}")
+        return []
+
+
+def get_now_next_events(services, with_next=True):
+    """Trenutni (i sledeći) EPG događaj za sve servise, jednim upitom eEPGCache-u"""
+    query = ["TSE"]  # T=naslov, S=kratak, E=opširan opis
+    for ref in services:
+        ref = ref.toString()
+        query.append((ref, 0, -1))  # u toku
+        if with_next:
+            query.append((ref, 1, -1))  # sledeći
+    try:
+        events = eEPGCache.getInstance().lookupEvent(query) or []
+    except Exception as e:
+        print(f"[TMDB] EPG now/next error: {e}")
+        return []
+    return [{'name': str(event[0] or ''), 'short': str(event[1] or ''), 'ext': str(event[2] or '')}
+            for event in events if event and len(event) >= 3 and event[0]]
+
+
+def get_neighbour_services(direction, count):
+    """Narednih `count` servisa bukea od trenutnog u smeru zapovanja (+1 dole, -1 gore)"""
+    current = get_current_service()
+    services = get_bouquet_services()
+    if not current or not services:
+        return []
+    refs = [ref.toString() for ref in services]
+    try:
+        idx = refs.index(current.toString())
+    except ValueError:
+        return []
+    count = min(count, len(services) - 1)
+    return [services[(idx + direction * step) % len(services)] for step in range(1, count + 1)]
+
+
+def parse_epg_title(raw_title, description=""):
+    """(naslov, godina) za pretragu iz EPG naziva i opisa emisije"""
+    title = re.sub(r"\s*\[.*?\]|\s*\(.*?\)|\s*-\s*.+$", "", raw_title).strip()
+    title = re.sub(r"^Film[:\-]?\s*|^Movie[:\-]?\s*", "", title, flags=re.I).strip()
+
+    # Izvlačenje godine iz naslova ili opisa
+    year = None
+    year_match = re.search(r"\b(19|20)\d{2}\b", raw_title + " " + description)
+    if year_match:
+        year = int(year_match.group(0))
+    return title, year
+
 def ensure_cache_folder():
     folder = config.plugins.ciefptmdb.cache_folder.value
     if not os.path.exists(folder):
@@ -199,10 +328,1937 @@ def ensure_cache_folder():
             pass
     return folder
 
+_cold_folder_error = [None]  # folder čija je greška već prijavljena
+
+
+def cold_cache_folder():
+    """Folder trajnog nivoa ili None (isključen, isti kao radni ili disk nije montiran).
+
+    Montiranje se proverava pri svakom pozivu: USB disk može da se izvadi
+    ili montira tek posle starta, a bez diska ne pišemo u prazan mount
+    point na flash-u.
+    """
+    value = config.plugins.ciefptmdb.cold_cache_folder.value
+    if value == "none" or os.path.normpath(value) == os.path.normpath(config.plugins.ciefptmdb.cache_folder.value):
+        return None
+    if not os.path.ismount(os.path.dirname(os.path.normpath(value))):
+        return None
+    if not os.path.isdir(value):
+        try:
+            os.makedirs(value)
+        except Exception as e:
+            if _cold_folder_error[0] != value:
+                _cold_folder_error[0] = value
+                print(f"[TMDB] Cold cache folder error: {e}")
+            return None
+    return value
+
 ensure_cache_folder()
 load_api_key_from_file()
 load_omdb_api_key_from_file()  # UČITAJ OMDb API KEY
 
+# ---------- REQUEST CANCELLATION ----------
+class RequestCancelled(Exception):
+    """Zahtev pripada generaciji koja je u međuvremenu otkazana"""
+
+
+class CancelToken(object):
+    """Token jedne generacije zahteva; cancel() prekida i njene mrežne čitanja"""
+
+    def __init__(self, budget=None):
+        self._lock = threading.Lock()
+        self._conns = set()
+        self.cancelled = False
+        self.budget = budget  # najviše mrežnih zahteva (None = bez ograničenja)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            conns, self._conns = self._conns, set()
+        for conn in conns:
+            # shutdown budi nit blokiranu u recv(), close() sam to ne garantuje
+            try:
+                if conn.sock is not None:
+                    conn.sock.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise RequestCancelled()
+
+    def spend(self):
+        """Troši jedan mrežni zahtev iz budžeta; prazan budžet otkazuje generaciju"""
+        with self._lock:
+            exhausted = self.budget is not None and self.budget <= 0
+            if self.budget is not None:
+                self.budget -= 1
+        if exhausted:
+            self.cancel()
+        self.raise_if_cancelled()
+
+    def attach(self, conn):
+        with self._lock:
+            if self.cancelled:
+                raise RequestCancelled()
+            self._conns.add(conn)
+
+    def detach(self, conn):
+        with self._lock:
+            self._conns.discard(conn)
+
+    def guard(self, callback):
+        """Vraća callback koji odbacuje rezultat ako je generacija otkazana"""
+        def guarded(*args, **kwargs):
+            if not self.cancelled:
+                return callback(*args, **kwargs)
+        return guarded
+
+
+# Nit koja izvršava posao iz DownloadPool-a ovde drži token tog posla
+_request_context = threading.local()
+
+
+def current_token():
+    return getattr(_request_context, "token", None)
+
+
+def current_priority():
+    """Prioritet posla koji nit trenutno izvršava (0 = interaktivno)"""
+    return getattr(_request_context, "priority", 0)
+
+# ---------- RATE LIMITING ----------
+# host -> (zahteva u sekundi, burst); image.tmdb.org je CDN bez limita
+RATE_LIMITS = {
+    "api.themoviedb.org": (20.0, 20),
+    "www.omdbapi.com": (5.0, 5),
+}
+RATE_MAX_WAIT = 10  # duže od ovoga interaktivni zahtev ne čeka, nego odustaje
+
+
+class RateLimiter(object):
+    """Token bucket po hostu sa adaptivnom brzinom (AIMD).
+
+    429 prepolovi brzinu i blokira host do isteka Retry-After, svaki
+    uspešan odgovor je polako vraća ka nominalnoj. Pozadinski zahtevi
+    ostavljaju `reserve` tokena netaknutim, pa interaktivni uvek prolaze prvi.
+    """
+
+    MIN_RATE = 0.5
+
+    def __init__(self, rate, burst, reserve=None):
+        self._lock = threading.Lock()
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.reserve = burst / 4.0 if reserve is None else float(reserve)
+        self._tokens = float(burst)
+        self._stamp = time.time()
+        self._blocked_until = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def acquire(self, background=False, token=None):
+        needed = 1.0 + (self.reserve if background else 0.0)
+        started = time.time()
+        while True:
+            with self._lock:
+                now = time.time()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= needed:
+                    self._tokens -= 1.0
+                    return
+                wait = max(self._blocked_until - now, (needed - self._tokens) / self.rate)
+            if not background and now + wait - started > RATE_MAX_WAIT:
+                raise HTTPStatusError(429, "Rate limited")
+            if token is not None:
+                token.raise_if_cancelled()
+            # Kratki koraci da bi otkazivanje brzo stiglo do čekajuće niti
+            time.sleep(min(wait, 0.25))
+
+    def throttled(self, retry_after=None):
+        with self._lock:
+            now = time.time()
+            self.rate = max(self.MIN_RATE, self.rate / 2.0)
+            self._tokens = 0.0
+            self._stamp = now
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self._blocked_until = max(self._blocked_until, now + pause)
+        print(f"[TMDB] Rate limited, backing off to {self.rate:.1f} req/s for {pause:.1f}s")
+
+    def succeeded(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20.0)
+
+
+def parse_retry_after(value):
+    """Retry-After je broj sekundi ili HTTP datum; vraća sekunde ili None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.mktime_tz(email.utils.parsedate_tz(value)) - time.time())
+    except Exception:
+        return None
+
+
+rate_limiters = dict((host, RateLimiter(rate, burst)) for host, (rate, burst) in RATE_LIMITS.items())
+
+# ---------- CIRCUIT BREAKER ----------
+TMDB_API_HOST = "api.themoviedb.org"
+CONNECT_TIMEOUT = 3  # dostupnost hosta znamo brzo, čitanje i dalje ima svoj timeout
+
+
+class HostUnavailable(OSError):
+    """Host je označen kao nedostupan; zahtev se odbija bez mreže"""
+
+    def __init__(self, host, retry_in=0):
+        OSError.__init__(self, f"{host} unavailable, retry in {retry_in:.0f}s")
+        self.host = host
+
+
+class _ConnectFailed(OSError):
+    """Neuspela TCP/TLS konekcija - jasan znak da host (ili mreža) nije dostupan"""
+
+
+class CircuitBreaker(object):
+    """Closed -> open posle uzastopnih grešaka, half-open propušta jedan probni zahtev.
+
+    Neuspela konekcija odmah otvara prekidač; timeout čitanja se broji
+    do FAILURE_THRESHOLD. Svaki neuspeli probni zahtev udvostručuje pauzu.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+    FAILURE_THRESHOLD = 2
+    BASE_COOLDOWN = 15
+    MAX_COOLDOWN = 120
+    PROBE_TIMEOUT = 60  # probni zahtev bez presude duže od ovoga se ne čeka
+
+    def __init__(self, host):
+        self._lock = threading.Lock()
+        self.host = host
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._cooldown = self.BASE_COOLDOWN
+        self._probing = False
+        self._probe_started = 0.0
+
+    @property
+    def available(self):
+        return self.state != self.OPEN
+
+    def allow(self):
+        """Podiže HostUnavailable ako zahtev ne sme na mrežu; vraća True za probni zahtev"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            now = time.time()
+            if self.state == self.OPEN and now >= self._opened_at + self._cooldown:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and self._probing and now - self._probe_started > self.PROBE_TIMEOUT:
+                self._probing = False  # probna nit je zaglavljena ili izgubljena
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                self._probe_started = now
+                return True
+            raise HostUnavailable(self.host, max(0.0, self._opened_at + self._cooldown - now))
+
+    def release(self):
+        """Probni zahtev je završen bez presude (otkazan, limiter) - sledeći sme da proba"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+    def record_success(self):
+        if self.state == self.CLOSED and not self._failures:
+            return
+        with self._lock:
+            if self.state != self.CLOSED:
+                print(f"[TMDB] {self.host} reachable again")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._cooldown = self.BASE_COOLDOWN
+            self._probing = False
+
+    def record_failure(self, hard=False):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN:
+                self._cooldown = min(self.MAX_COOLDOWN, self._cooldown * 2)
+            elif not hard and self._failures < self.FAILURE_THRESHOLD:
+                return
+            self.state = self.OPEN
+            self._opened_at = time.time()
+            self._probing = False
+        print(f"[TMDB] {self.host} unreachable, failing fast for {self._cooldown}s")
+
+# ---------- HTTP CLIENT ----------
+class HTTPStatusError(Exception):
+    """HTTP odgovor sa statusom >= 400"""
+
+    def __init__(self, status, reason="", headers=None):
+        Exception.__init__(self, f"HTTP {status} {reason}".strip())
+        self.status = status
+        self.headers = headers or {}
+
+
+class IncompleteDownload(OSError):
+    """Telo odgovora je kraće od Content-Length ili slika nema završni marker"""
+
+
+def image_complete(path):
+    """Da li JPEG/PNG fajl ima završni marker (FFD9 / IEND); ostali formati se ne proveravaju"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(4)
+            f.seek(0, 2)
+            if f.tell() < 16:
+                return False
+            f.seek(-12, 2)
+            tail = f.read()
+    except OSError:
+        return False
+    if head.startswith(b"\xff\xd8"):
+        # neki enkoderi dopisuju nule posle EOI
+        return tail.rstrip(b"\x00").endswith(b"\xff\xd9")
+    if head.startswith(b"\x89PNG"):
+        return b"IEND" in tail
+    return True
+
+
+class _ResumableHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS konekcija koja nastavlja prethodnu TLS sesiju za isti host"""
+
+    def __init__(self, host, context, sessions, timeout):
+        http.client.HTTPSConnection.__init__(self, host, timeout=timeout, context=context)
+        self._sessions = sessions
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        host = self._tunnel_host or self.host  # preko proxy-ja TLS ide do pravog hosta
+        session = self._sessions.get(host)
+        try:
+            self.sock = self._context.wrap_socket(self.sock, server_hostname=host, session=session)
+        except ssl.SSLError:
+            if session is None:
+                raise
+            # Server odbio resumption - probaj sa punim handshake-om na novom socketu
+            self._sessions.pop(host, None)
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+            http.client.HTTPConnection.connect(self)
+            self.sock = self._context.wrap_socket(self.sock, server_hostname=host)
+
+
+class TMDBHttpClient(object):
+    """Deljeni HTTP klijent: keep-alive konekcije po hostu, jedan SSL context, TLS resumption"""
+
+    MAX_IDLE_PER_HOST = 4
+    IDLE_TIMEOUT = 30  # TMDB/CDN zatvaraju neaktivne konekcije posle ~60s
+    MAX_REDIRECTS = 3
+    MAX_THROTTLE_RETRIES = 2
+    CHUNK_SIZE = 32 * 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = {}       # (scheme, host) -> [(conn, last_used), ...]
+        self._sessions = {}   # host -> ssl.SSLSession
+        self._breakers = {}   # host -> CircuitBreaker
+        self._ssl_context = ssl.create_default_context()
+        self._ssl_context.check_hostname = False
+        self._ssl_context.verify_mode = ssl.CERT_NONE
+        self._proxies = urllib.request.getproxies()  # http_proxy/https_proxy iz okruženja
+        self.headers = {
+            "User-Agent": f"{PLUGIN_NAME}/{PLUGIN_VERSION}",
+            "Accept-Encoding": "gzip",
+            "Connection": "keep-alive",
+        }
+
+    def _acquire(self, scheme, host, timeout):
+        now = time.time()
+        with self._lock:
+            idle = self._idle.get((scheme, host), [])
+            while idle:
+                conn, last_used = idle.pop()
+                if now - last_used < self.IDLE_TIMEOUT and conn.sock:
+                    conn.timeout = timeout
+                    conn.sock.settimeout(timeout)
+                    return conn, True
+                conn.close()
+        return self._new_connection(scheme, host, timeout), False
+
+    def _proxy_for(self, scheme, host):
+        """host:port proxy-ja za šemu ili None (poštuje no_proxy)"""
+        proxy = self._proxies.get(scheme)
+        if not proxy or urllib.request.proxy_bypass(host):
+            return None
+        return urllib.parse.urlsplit(proxy if "://" in proxy else "http://" + proxy).netloc.rpartition("@")[2]
+
+    def _new_connection(self, scheme, host, timeout):
+        proxy = self._proxy_for(scheme, host)
+        if scheme == "https":
+            if proxy is None:
+                return _ResumableHTTPSConnection(host, self._ssl_context, self._sessions, timeout)
+            conn = _ResumableHTTPSConnection(proxy, self._ssl_context, self._sessions, timeout)
+            conn.set_tunnel(host)
+            return conn
+        if proxy is None:
+            return http.client.HTTPConnection(host, timeout=timeout)
+        # Običan HTTP preko proxy-ja traži apsolutni URL u zahtevu
+        conn = http.client.HTTPConnection(proxy, timeout=timeout)
+        conn.url_prefix = "http://" + host
+        return conn
+
+    def breaker(self, host):
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(host)
+            return breaker
+
+    def is_available(self, host):
+        """False dok je prekidač za host otvoren (npr. nema mreže)"""
+        breaker = self._breakers.get(host)
+        return breaker is None or breaker.available
+
+    def _connect(self, conn, timeout):
+        conn.timeout = min(timeout, CONNECT_TIMEOUT)
+        try:
+            conn.connect()
+        except Exception as e:
+            conn.close()
+            raise _ConnectFailed(f"connect to {conn.host} failed: {e}")
+        conn.timeout = timeout
+        conn.sock.settimeout(timeout)
+
+    def _send(self, conn, path, token=None, sink=None):
+        if token is not None:
+            token.attach(conn)
+        try:
+            if conn.sock is None:
+                self._connect(conn, conn.timeout)
+            conn.request("GET", getattr(conn, "url_prefix", "") + path, headers=self.headers)
+            resp = conn.getresponse()
+            if sink is None or resp.status != 200:
+                return resp, resp.read()
+            return resp, self._stream(resp, sink)
+        except Exception:
+            conn.close()
+            raise
+        finally:
+            if token is not None:
+                token.detach(conn)
+
+    def _stream(self, resp, sink):
+        """Upisuje telo u `sink` u delovima i proverava Content-Length; vraća b"""""
+        sink.seek(0)
+        sink.truncate()  # ponovljen pokušaj kreće od nule
+        decoder = None
+        if (resp.getheader("Content-Encoding") or "").lower() == "gzip":
+            decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        received = 0
+        while True:
+            chunk = resp.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            received += len(chunk)
+            sink.write(decoder.decompress(chunk) if decoder else chunk)
+        if decoder:
+            sink.write(decoder.flush())
+        expected = resp.getheader("Content-Length")
+        if expected is not None and expected.isdigit() and received != int(expected):
+            raise IncompleteDownload(f"got {received} of {expected} bytes")
+        return b""
+
+    def _release(self, scheme, host, conn):
+        if scheme == "https" and conn.sock is not None:
+            # TLS 1.3 tiket stiže tek posle prvog odgovora, zato ga čuvamo ovde
+            try:
+                if conn.sock.session is not None:
+                    self._sessions[host] = conn.sock.session
+            except Exception:
+                pass
+        with self._lock:
+            idle = self._idle.setdefault((scheme, host), [])
+            if len(idle) < self.MAX_IDLE_PER_HOST:
+                idle.append((conn, time.time()))
+                return
+        conn.close()
+
+    def request(self, url, timeout=10, sink=None):
+        """GET zahtev; vraća (status, headers, body) ili podiže HTTPStatusError.
+
+        Sa `sink` (fajl otvoren za pisanje) se telo uspešnog odgovora strimuje
+        u njega, a body je prazan.
+        """
+        redirects = throttled = 0
+        while True:
+            parts = urllib.parse.urlsplit(url)
+            scheme, host = parts.scheme, parts.netloc
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+
+            token = current_token()
+            if token is not None:
+                token.spend()
+            breaker = self.breaker(host)
+            limiter = rate_limiters.get(host)
+            probe = breaker.allow()
+            judged = False
+            try:
+                if limiter is not None:
+                    limiter.acquire(current_priority() > 0, token)
+                conn, reused = self._acquire(scheme, host, timeout)
+                try:
+                    try:
+                        resp, body = self._send(conn, path, token, sink)
+                    except (http.client.HTTPException, OSError):
+                        if token is not None:
+                            token.raise_if_cancelled()
+                        if not reused:
+                            raise
+                        # Server je zatvorio keep-alive konekciju - ponovi na novoj
+                        conn = self._new_connection(scheme, host, timeout)
+                        resp, body = self._send(conn, path, token, sink)
+                except (http.client.HTTPException, OSError) as e:
+                    if token is not None:
+                        token.raise_if_cancelled()
+                    judged = True
+                    breaker.record_failure(hard=isinstance(e, _ConnectFailed))
+                    raise
+                judged = True
+                if resp.status in (502, 503, 504):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            finally:
+                if probe and not judged:
+                    # Otkazan probni zahtev nije presuda o hostu - pusti sledeći
+                    breaker.release()
+            if token is not None and token.cancelled:
+                conn.close()
+                raise RequestCancelled()
+
+            headers = dict((k.lower(), v) for k, v in resp.getheaders())
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(scheme, host, conn)
+
+            if body and headers.get("content-encoding") == "gzip":
+                body = gzip.decompress(body)
+
+            if resp.status in (301, 302, 303, 307, 308) and headers.get("location"):
+                redirects += 1
+                if redirects > self.MAX_REDIRECTS:
+                    raise HTTPStatusError(310, "Too many redirects")
+                url = urllib.parse.urljoin(url, headers["location"])
+                continue
+            if resp.status == 429 and limiter is not None:
+                limiter.throttled(parse_retry_after(headers.get("retry-after")))
+                throttled += 1
+                if throttled <= self.MAX_THROTTLE_RETRIES:
+                    continue
+            if resp.status >= 400:
+                raise HTTPStatusError(resp.status, resp.reason, headers)
+            if limiter is not None:
+                limiter.succeeded()
+            return resp.status, headers, body
+
+    def get_json(self, url, timeout=10):
+        status, headers, body = self.request(url, timeout)
+        return json.loads(body.decode("utf-8", errors="ignore"))
+
+    def get_bytes(self, url, timeout=8):
+        status, headers, body = self.request(url, timeout)
+        return body
+
+    def download(self, url, dest, timeout=10):
+        """Strimuje odgovor u fajl `dest` i proverava da je slika cela; vraća broj bajtova.
+
+        Pri bilo kakvoj grešci `dest` se briše, pa nepotpun fajl nikad ne ostaje.
+        """
+        try:
+            with open(dest, "wb") as f:
+                self.request(url, timeout, sink=f)
+                size = f.tell()
+            if not image_complete(dest):
+                raise IncompleteDownload(f"truncated image from {url}")
+            return size
+        except BaseException:
+            try:
+                os.remove(dest)
+            except OSError:
+                pass
+            raise
+
+    def close_idle(self):
+        """Zatvara sve neaktivne konekcije (npr. pri izlasku iz plugina)"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _ in conns:
+                conn.close()
+
+
+http_client = TMDBHttpClient()
+
+# ---------- REQUEST COALESCING ----------
+class _FlightCall(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Identični zahtevi u letu dele jedan round-trip i isti dekodirani rezultat.
+
+    `linger` sekundi posle završetka rezultat se vraća i uzastopnim pozivima.
+    """
+
+    MAX_RECENT = 64
+
+    def __init__(self, linger=0):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._recent = OrderedDict()  # key -> (vreme, rezultat)
+        self.linger = linger
+
+    def do(self, key, fn, *args):
+        while True:
+            with self._lock:
+                recent = self._recent.get(key)
+                if recent is not None and time.time() - recent[0] < self.linger:
+                    return recent[1]
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _FlightCall()
+            if leader:
+                return self._lead(key, call, fn, args)
+
+            token = current_token()
+            while not call.event.wait(0.2):
+                if token is not None:
+                    token.raise_if_cancelled()
+            if isinstance(call.error, RequestCancelled):
+                continue  # otkazan je tuđi zahtev, ne naš - pokušaj ponovo
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+    def _lead(self, key, call, fn, args):
+        try:
+            call.result = fn(*args)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.linger:
+                    self._recent[key] = (time.time(), call.result)
+                    while len(self._recent) > self.MAX_RECENT:
+                        self._recent.popitem(last=False)
+            call.event.set()
+
+
+json_flight = SingleFlight(linger=15)
+image_flight = SingleFlight()
+
+
+# ---------- CACHE LAYOUT ----------
+# Fajlovi keša su u 256 poddirektorijuma ("00".."ff") po hešu imena, pa ni
+# desetine hiljada slika ne usporavaju listdir/lookup na FAT/exFAT i ext4.
+SHARD_RE = re.compile(r"^[0-9a-f]{2}$")
+
+
+def shard_for(name):
+    return hashlib.md5(name.encode("utf-8")).hexdigest()[:2]
+
+
+def sharded_path(folder, name, create=False):
+    """Putanja fajla u njegovom shard-u; sa create=True shard se pravi po potrebi"""
+    shard = os.path.join(folder, shard_for(name))
+    if create and not os.path.isdir(shard):
+        try:
+            os.makedirs(shard)
+        except OSError:
+            pass  # druga nit ga je upravo napravila
+    return os.path.join(shard, name)
+
+
+def shard_files(folder, shard=None):
+    """(ime, putanja) za fajlove u svim shard-ovima ili samo u jednom"""
+    if shard is None:
+        try:
+            shards = sorted(d for d in os.listdir(folder) if SHARD_RE.match(d))
+        except OSError:
+            return
+    else:
+        shards = [shard]
+    for shard in shards:
+        path = os.path.join(folder, shard)
+        try:
+            names = os.listdir(path)
+        except OSError:
+            continue
+        for name in names:
+            yield name, os.path.join(path, name)
+
+
+def migrate_flat_layout(folder, wanted):
+    """Premešta fajlove iz stare ravne strukture u shard-ove; vraća broj premeštenih"""
+    moved = 0
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return 0
+    for name in names:
+        src = os.path.join(folder, name)
+        if not wanted(name) or not os.path.isfile(src):
+            continue
+        try:
+            os.replace(src, sharded_path(folder, name, create=True))
+            moved += 1
+        except OSError as e:
+            print(f"[TMDB] Cache migration error: {e}")
+    if moved:
+        print(f"[TMDB] Cache layout: moved {moved} files into shards in {folder}")
+    return moved
+
+# ---------- METADATA CACHE ----------
+# (host, regex za path, TTL u sekundama) - prvi pogodak odlučuje
+METADATA_TTLS = [
+    ("api.themoviedb.org", re.compile(r"^/3/(trending/|movie/popular|tv/popular|person/popular|movie/top_rated|tv/top_rated|movie/upcoming)"), 2 * 3600),
+    ("api.themoviedb.org", re.compile(r"^/3/search/"), 12 * 3600),
+    ("api.themoviedb.org", re.compile(r"^/3/tv/\d+"), 24 * 3600),  # serije u toku dobijaju nove epizode
+    ("api.themoviedb.org", re.compile(r"^/3/(movie|person)/\d+"), 7 * 24 * 3600),
+    ("www.omdbapi.com", re.compile(r"^/"), 3 * 24 * 3600),
+]
+METADATA_EMPTY_TTL = 10 * 60  # prazna pretraga - naslov možda tek stiže na TMDB
+METADATA_MAX_AGE = 7 * 24 * 3600
+METADATA_MAX_MB = 10                  # radni nivo je obično /tmp u RAM-u
+METADATA_PRUNE_INTERVAL = 3600
+
+
+class MetadataCache(object):
+    """JSON keš odgovora na disku, ključ je endpoint + parametri + jezik.
+
+    Poslednji odgovori se drže i parsirani u memoriji; sa trajnim nivoom
+    promašaj u cache_folder-u se kopira sa diska (mtime ostaje, TTL važi).
+    Radni nivo ima budžet u bajtovima: LRU indeks se gradi pri periodičnom
+    čišćenju, a najstariji zapisi se brišu kada se budžet pređe.
+    """
+
+    SECRET_PARAMS = ("api_key", "apikey")
+    MEMORY_ENTRIES = 64
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pruned_at = 0
+        self._index = None            # ime -> veličina, najstariji prvi; None do prvog čišćenja
+        self._index_folder = None
+        self._total = 0
+        self._memory = OrderedDict()  # ključ -> (vreme upisa, podaci)
+        self._cold_names = None       # (folder, {shard: set imena}) - jedan listdir po shard-u
+        self._migrated = set()
+
+    def _prepare(self, folder):
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except Exception:
+                return None
+        if folder not in self._migrated:
+            self._migrated.add(folder)
+            migrate_flat_layout(folder, lambda name: name.endswith(".json"))
+        return folder
+
+    def folder(self):
+        return self._prepare(os.path.join(ensure_cache_folder(), "meta"))
+
+    def ttl_for(self, url):
+        parts = urllib.parse.urlsplit(url)
+        for host, pattern, ttl in METADATA_TTLS:
+            if parts.netloc == host and pattern.match(parts.path):
+                return ttl
+        return 0
+
+    def ttl_of(self, ttl, data):
+        """TTL konkretnog zapisa: prazni rezultati važe kratko"""
+        if isinstance(data, dict) and data.get("results") == []:
+            return min(ttl, METADATA_EMPTY_TTL)
+        return ttl
+
+    def key_for(self, url):
+        parts = urllib.parse.urlsplit(url)
+        params = [(k, v) for k, v in urllib.parse.parse_qsl(parts.query) if k not in self.SECRET_PARAMS]
+        params.append(("~lang", config.plugins.ciefptmdb.language.value))
+        raw = parts.netloc + parts.path + "?" + urllib.parse.urlencode(sorted(params))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def path_for(self, url, create=False):
+        return sharded_path(self.folder(), self.key_for(url) + ".json", create)
+
+    def cold_folder(self):
+        folder = cold_cache_folder()
+        if folder is None:
+            return None
+        return self._prepare(os.path.join(folder, "meta"))
+
+    def _cold_names_for(self, name):
+        """(folder, imena u shard-u zapisa) trajnog nivoa; svaki shard se lista jednom"""
+        folder = self.cold_folder()
+        if folder is None:
+            return None, set()
+        shard = shard_for(name)
+        with self._lock:
+            if self._cold_names is None or self._cold_names[0] != folder:
+                self._cold_names = (folder, {})
+            shards = self._cold_names[1]
+            if shard not in shards:
+                shards[shard] = set(n for n, _ in shard_files(folder, shard))
+            return folder, shards[shard]
+
+    def _remember(self, key, stored_at, data):
+        with self._lock:
+            self._memory[key] = (stored_at, data)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+
+    def _track(self, name, size):
+        """Upisuje zapis u LRU indeks; vraća imena koja treba obrisati (poziva se pod lock-om)"""
+        if self._index is None:
+            return []
+        self._total += size - self._index.pop(name, 0)
+        self._index[name] = size
+        return self._over_budget()
+
+    def _over_budget(self):
+        victims = []
+        while self._total > METADATA_MAX_MB * 1024 * 1024 and len(self._index) > 1:
+            victim, victim_size = self._index.popitem(last=False)
+            self._total -= victim_size
+            victims.append(victim)
+        return victims
+
+    def _touch(self, key):
+        with self._lock:
+            if self._index is not None and key + ".json" in self._index:
+                self._index.move_to_end(key + ".json")
+
+    def _drop(self, folder, victims):
+        for name in victims:
+            try:
+                os.remove(sharded_path(folder, name))
+            except OSError:
+                pass
+        return len(victims)
+
+    def _promote(self, key, path):
+        """Kopira zapis iz trajnog nivoa u radni; True ako je uspelo"""
+        name = key + ".json"
+        folder, names = self._cold_names_for(name)
+        if name not in names:
+            return False
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copy2(sharded_path(folder, name), tmp)
+            os.replace(tmp, path)
+            working = self.folder()
+            with self._lock:
+                victims = self._track(name, os.path.getsize(path)) if self._index_folder == working else []
+            self._drop(working, victims)
+            return True
+        except Exception as e:
+            print(f"[TMDB] Metadata promotion error: {e}")
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+            return False
+
+    def get(self, url, stale=False):
+        """Vraća zapis mlađi od TTL-a; sa stale=True i istekao (kada mreža nije dostupna)"""
+        ttl = self.ttl_for(url)
+        if not ttl:
+            return None
+        key = self.key_for(url)
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None:
+                self._memory.move_to_end(key)
+        if hit is not None and (stale or time.time() - hit[0] <= self.ttl_of(ttl, hit[1])):
+            self._touch(key)
+            return hit[1]
+        path = sharded_path(self.folder(), key + ".json", create=True)
+        if not os.path.exists(path) and not self._promote(key, path):
+            return None
+        try:
+            stored_at = os.path.getmtime(path)
+            age = time.time() - stored_at
+            if not stale and age > ttl:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return None
+        if not stale and age > self.ttl_of(ttl, data):
+            return None
+        self._remember(key, stored_at, data)
+        self._touch(key)
+        return data
+
+    def put(self, url, data):
+        if not data or not self.ttl_for(url):
+            return
+        if isinstance(data, dict) and data.get("Response") == "False":
+            return  # OMDb greške (limit, pogrešan ključ) ne keširamo
+        key = self.key_for(url)
+        self._remember(key, time.time(), data)
+        folder = self.folder()
+        path = sharded_path(folder, key + ".json", create=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        victims = []
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, path)
+            with self._lock:
+                if self._index_folder == folder:
+                    victims = self._track(key + ".json", os.path.getsize(path))
+        except Exception as e:
+            print(f"[TMDB] Metadata cache write error: {e}")
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+        self._drop(folder, victims)
+        if time.time() - self._pruned_at > METADATA_PRUNE_INTERVAL:
+            self._pruned_at = time.time()
+            download_pool.submit(self.prune, priority=PRIORITY_PREFETCH)
+
+    def prune(self, folder=None):
+        """Briše zapise starije od najdužeg TTL-a; za radni nivo ponovo gradi LRU indeks i drži budžet"""
+        working = self.folder()
+        folder = folder or working
+        limit = time.time() - METADATA_MAX_AGE
+        removed = 0
+        found = []
+        for name, path in shard_files(folder):
+            try:
+                st = os.stat(path)
+                if st.st_mtime < limit:
+                    os.remove(path)
+                    removed += 1
+                elif name.endswith(".json"):
+                    found.append((st.st_mtime, name, st.st_size))
+            except Exception:
+                pass
+        if folder != working:
+            return removed
+        found.sort()
+        index = OrderedDict((name, size) for _, name, size in found)
+        with self._lock:
+            if self._index is not None and self._index_folder == folder:
+                # Pogoci od prošlog čišćenja zadržavaju svoj redosled
+                for name in self._index:
+                    if name in index:
+                        index.move_to_end(name)
+            self._index = index
+            self._index_folder = folder
+            self._total = sum(index.values())
+            victims = self._over_budget()
+        return removed + self._drop(folder, victims)
+
+    def write_back(self):
+        """Kopira u trajni nivo zapise koji tamo ne postoje ili su stariji"""
+        cold = self.cold_folder()
+        if cold is None:
+            return 0
+        copied = 0
+        for name, src in shard_files(self.folder()):
+            if not name.endswith(".json"):
+                continue
+            _, names = self._cold_names_for(name)
+            dst = sharded_path(cold, name, create=True)
+            try:
+                if name in names and os.path.getmtime(dst) >= os.path.getmtime(src):
+                    continue
+                shutil.copy2(src, dst + ".tmp")
+                os.replace(dst + ".tmp", dst)
+                names.add(name)
+                copied += 1
+            except Exception as e:
+                print(f"[TMDB] Metadata write-back error: {e}")
+        if self.prune(cold):
+            with self._lock:
+                self._cold_names = None
+        return copied
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._cold_names = None
+            if self._index is not None:
+                self._index = OrderedDict()
+                self._total = 0
+        removed = 0
+        for folder in (self.folder(), self.cold_folder()):
+            if folder is None:
+                continue
+            for name, path in shard_files(folder):
+                try:
+                    os.remove(path)
+                    removed += 1
+                except Exception:
+                    pass
+        return removed
+
+
+metadata_cache = MetadataCache()
+
+
+def fetch_json(url, timeout=10):
+    """GET JSON preko metadata keša; mreža samo kada zapis ne postoji ili je istekao"""
+    return json_flight.do(metadata_cache.key_for(url), _fetch_json, url, timeout)
+
+
+def _fetch_json(url, timeout):
+    data = metadata_cache.get(url)
+    if data is not None:
+        return data
+    try:
+        data = http_client.get_json(url, timeout=timeout)
+    except (http.client.HTTPException, OSError, HTTPStatusError) as e:
+        if isinstance(e, HTTPStatusError) and e.status < 500 and e.status != 429:
+            raise
+        # Mreža/server nedostupni - bolje zastareo odgovor nego ništa
+        data = metadata_cache.get(url, stale=True)
+        if data is None:
+            raise
+        print(f"[TMDB] Serving stale cache entry: {e}")
+        return data
+    metadata_cache.put(url, data)
+    return data
+
+# ---------- IMAGE CACHE ----------
+TMDB_IMAGE_BASE = "https://image.tmdb.org/t/p/"
+# Slika se čuva jednom po (TMDB path, veličina): "{size}_{basename}"; vrsta je samo za statistiku
+IMAGE_NAME_RE = re.compile(r"^(?:\d+x\d+_)?(w\d+|h\d+|original)_")
+IMAGE_SIZE_KINDS = {"w500": "poster", "w1280": "backdrop", "h632": "person"}
+# vrsta -> prefiksi imena fajlova starijih verzija (per-ekran kopije)
+IMAGE_KINDS = OrderedDict([
+    ("poster", ("movie_", "tv_")),
+    ("backdrop", ("backdrop_movie_", "backdrop_tv_")),
+    ("gallery", ("gallery_backdrop_", "gallery_poster_")),
+    ("person", ("person_",)),
+])
+IMAGE_KIND_LABELS = {"poster": "Posters", "backdrop": "Backdrops", "gallery": "Gallery images", "person": "Person photos"}
+IMAGE_MANIFEST = "manifest.log"
+
+
+def image_name(file_path, size):
+    """Ime u kešu za TMDB sliku - isto bez obzira koji ekran je traži"""
+    return f"{size}_{os.path.basename(file_path)}"
+
+
+def image_kind(filename):
+    match = IMAGE_NAME_RE.match(filename)
+    if match:
+        return IMAGE_SIZE_KINDS.get(match.group(1), "other")
+    for kind, prefixes in IMAGE_KINDS.items():
+        if filename.startswith(prefixes):
+            return kind
+    return None
+
+
+class ImageCache(object):
+    """Slike u cache folderu sa ograničenjem veličine i LRU izbacivanjem.
+
+    Stanje se čuva u append-only manifestu (`+` upis, `~` pogodak, `-`
+    brisanje), pa statistika i brisanje po vrsti ne skeniraju folder.
+    Manifest se sažima kada naraste, a folder bez manifesta se jednom
+    skenira i postojeći fajlovi se preuzimaju u keš. Slike su u shard
+    poddirektorijumima (vidi CACHE LAYOUT), manifest ostaje u korenu.
+
+    Sa `cold` nivoom (HDD/USB) izbačene slike se premeštaju tamo umesto
+    brisanja, a promašaj se prvo traži u njemu i kopira nazad (promocija).
+    """
+
+    COMPACT_SLACK = 500  # toliko viška linija u manifestu pre sažimanja
+
+    def __init__(self, folder_fn=ensure_cache_folder, budget_mb=None, cold=None):
+        self._lock = threading.Lock()
+        self._folder_fn = folder_fn
+        self._budget_mb = budget_mb
+        self.cold = cold
+        self._folder = None
+        self._indexed = None  # folder čiji je indeks potpuno učitan
+        self._build_lock = threading.Lock()  # učitavanje indeksa, bez držanja _lock
+        self._index_pending = False
+        self._log = None
+        self._lines = 0
+        self._entries = OrderedDict()  # ime -> (veličina, vrsta), najstariji prvi
+        self._stats = {}               # vrsta -> [broj, bajtova]
+        self._total = 0
+        self._demoting = {}            # ime -> vrsta; fajl čeka kao "<ime>.demote"
+        self._flush_pending = False
+        self._touched = 0              # pogoci čiji redosled još nije u manifestu
+        self._recency_pending = False
+
+    def budget(self):
+        if self._budget_mb:
+            return self._budget_mb * 1024 * 1024
+        try:
+            return int(config.plugins.ciefptmdb.cache_max_size.value) * 1024 * 1024
+        except Exception:
+            return 50 * 1024 * 1024
+
+    def enabled(self):
+        return self._folder_fn() is not None
+
+    def _add(self, name, size, kind):
+        self._remove(name)
+        self._entries[name] = (size, kind)
+        stat = self._stats.setdefault(kind, [0, 0])
+        stat[0] += 1
+        stat[1] += size
+        self._total += size
+
+    def _remove(self, name):
+        entry = self._entries.pop(name, None)
+        if entry is not None:
+            size, kind = entry
+            stat = self._stats[kind]
+            stat[0] -= 1
+            stat[1] -= size
+            self._total -= size
+        return entry
+
+    def _append(self, *fields):
+        if self._log is None:
+            return
+        try:
+            self._log.write("\t".join(str(f) for f in fields) + "\n")
+            self._log.flush()
+            self._lines += 1
+        except Exception as e:
+            print(f"[TMDB] Image manifest write error: {e}")
+        if self._lines > 2 * len(self._entries) + self.COMPACT_SLACK:
+            self._compact()
+
+    def _compact(self):
+        """Prepisuje manifest tako da sadrži samo žive zapise, u LRU redosledu"""
+        path = os.path.join(self._folder, IMAGE_MANIFEST)
+        tmp = path + ".tmp"
+        try:
+            if self._log is not None:
+                self._log.close()
+            with open(tmp, "w", encoding="utf-8") as f:
+                for name, (size, kind) in self._entries.items():
+                    f.write(f"+\t{name}\t{size}\t{kind}\n")
+            os.replace(tmp, path)
+            self._lines = len(self._entries)
+            self._touched = 0
+        except Exception as e:
+            print(f"[TMDB] Image manifest compact error: {e}")
+        try:
+            self._log = open(path, "a", encoding="utf-8")
+        except Exception:
+            self._log = None
+
+    def _load(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                self._lines += 1
+                fields = line.rstrip("\n").split("\t")
+                try:
+                    if fields[0] == "+":
+                        self._add(fields[1], int(fields[2]), fields[3])
+                    elif fields[0] == "~" and fields[1] in self._entries:
+                        self._entries.move_to_end(fields[1])
+                    elif fields[0] == "-":
+                        self._remove(fields[1])
+                except (IndexError, ValueError):
+                    pass  # poslednja linija prekinuta padom - preskoči
+
+    def _adopt(self, folder):
+        """Jednokratno preuzimanje postojećih fajlova (prvo pokretanje, obrisan manifest)"""
+        found = []
+        for name, path in shard_files(folder):
+            if name.endswith(".demote"):
+                # prekinuto premeštanje u trajni nivo - slika je i dalje dobra
+                try:
+                    name = name[:-len(".demote")]
+                    target = sharded_path(folder, name, create=True)
+                    os.replace(path, target)
+                    path = target
+                except OSError:
+                    continue
+            kind = image_kind(name)
+            if name.endswith((".tmp", ".part")) or (kind is not None and not image_complete(path)):
+                # ostatak prekinutog upisa ili odsečena slika iz starijih verzija
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if kind is None:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            found.append((st.st_mtime, name, st.st_size, kind))
+        found.sort()
+        for _, name, size, kind in found:
+            self._add(name, size, kind)
+
+    def _index(self):
+        """Folder čiji je indeks u memoriji (poziva se pod lock-om, posle _ensure_index)"""
+        return self._folder
+
+    def _ensure_index(self, wait=True):
+        """Učitava indeks foldera van glavnog lock-a; vraća False dok nije spreman.
+
+        Prvo učitavanje posle nadogradnje (migracija, provera svakog fajla)
+        može da traje, pa ga main loop samo pokrene (wait=False) u pozadini.
+        """
+        if self.indexed():
+            return True
+        if not wait:
+            with self._lock:
+                pending, self._index_pending = self._index_pending, True
+            if not pending:
+                download_pool.submit(self._ensure_index, priority=PRIORITY_PREFETCH)
+            return False
+        with self._build_lock:
+            self._index_pending = False
+            if not self.indexed():
+                self._build(self._folder_fn())
+        return True
+
+    def _build(self, folder):
+        """Manifest ili skeniranje foldera u privremeni indeks, pa zamena pod lock-om"""
+        scratch = ImageCache(lambda: folder)
+        if folder is not None:
+            path = os.path.join(folder, IMAGE_MANIFEST)
+            try:
+                # Imena se ne menjaju, pa manifest stare ravne strukture i dalje važi
+                migrate_flat_layout(folder, lambda name: image_kind(name) is not None)
+                if os.path.exists(path):
+                    scratch._load(path)
+                else:
+                    scratch._adopt(folder)
+            except Exception as e:
+                print(f"[TMDB] Image cache index error: {e}")
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            self._entries = scratch._entries
+            self._stats = scratch._stats
+            self._total = scratch._total
+            self._lines = scratch._lines
+            self._touched = 0
+            self._demoting = {}
+            self._folder = folder
+            if folder is not None:
+                self._compact()
+                self._evict(folder)
+            self._indexed = folder
+
+    def indexed(self):
+        """Da li je indeks već u memoriji - tada stats() ne dira disk (bez lock-a, za main loop)"""
+        return self._indexed == self._folder_fn()
+
+    def load_index(self):
+        """Za main loop: True ako je indeks spreman, inače pokreće učitavanje u pozadini"""
+        return self._ensure_index(wait=False)
+
+    def lookup(self, filename, promote=False):
+        """Putanja keširane slike ili None; pogodak je pomera na kraj LRU reda.
+
+        Sa promote=True promašaj se traži i u trajnom nivou (čita disk, pa
+        samo iz radnih niti). Bez njega se ne čeka na učitavanje indeksa -
+        dok traje, to je promašaj.
+        """
+        if not self._ensure_index(wait=promote):
+            return None
+        with self._lock:
+            folder = self._index()
+            if folder is None:
+                return None
+            path = sharded_path(folder, filename)
+            kind = self._demoting.pop(filename, None)
+            if kind is not None:
+                # Izbačena, ali još nije prebačena na disk - vrati je
+                try:
+                    os.replace(path + ".demote", path)
+                    self._add(filename, os.path.getsize(path), kind)
+                    self._append("+", filename, self._entries[filename][0], kind)
+                except OSError:
+                    pass
+            if filename in self._entries:
+                if not os.path.exists(path):
+                    # Neko je obrisao fajl mimo keša
+                    self._remove(filename)
+                    self._append("-", filename)
+                    return None
+                # Redosled se menja samo u memoriji; na disk ide u paketu
+                self._entries.move_to_end(filename)
+                self._touched += 1
+                if self._touched > self.COMPACT_SLACK and not self._recency_pending:
+                    self._recency_pending = True
+                    download_pool.submit(self.flush_recency, priority=PRIORITY_PREFETCH)
+                return path
+        if promote and self.cold is not None:
+            return self._promote(filename)
+        return None
+
+    def contains(self, filename):
+        self._ensure_index()
+        with self._lock:
+            return self._index() is not None and filename in self._entries
+
+    def _promote(self, filename):
+        """Kopira sliku iz trajnog nivoa u ovaj; vraća novu putanju ili None"""
+        if not self.cold.contains(filename):
+            return None
+        src = self.cold.lookup(filename)
+        if src is None:
+            return None
+        try:
+            return self.import_file(filename, src, self.cold.kind_of(filename))
+        except Exception as e:
+            print(f"[TMDB] Cache promotion error: {e}")
+            return None
+
+    def kind_of(self, filename):
+        with self._lock:
+            entry = self._entries.get(filename)
+            return entry[1] if entry else None
+
+    def store(self, filename, data, kind=None):
+        """Atomski upisuje sliku i izbacuje najstarije dok ne stane u budžet"""
+        self._ensure_index()
+        with self._lock:
+            folder = self._index()
+        path = sharded_path(folder, filename, create=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+            raise
+        self._commit(folder, filename, len(data), kind)
+        return path
+
+    def import_file(self, filename, src, kind=None):
+        """Kopira postojeći fajl u keš (promocija/demotion između nivoa); vraća putanju ili None"""
+        self._ensure_index()
+        with self._lock:
+            folder = self._index()
+        if folder is None:
+            return None
+        path = sharded_path(folder, filename, create=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+            raise
+        self._commit(folder, filename, os.path.getsize(path), kind)
+        return path
+
+    def download(self, filename, url, kind=None, timeout=10):
+        """Strimuje sliku u .part fajl, proverava je i tek onda je preimenuje u keš.
+
+        Vraća (putanja, broj bajtova); u memoriji nikad nije cela slika.
+        """
+        self._ensure_index()
+        with self._lock:
+            folder = self._index()
+        path = sharded_path(folder, filename, create=True)
+        part = f"{path}.{threading.get_ident()}.part"
+        size = http_client.download(url, part, timeout)
+        try:
+            os.replace(part, path)
+        except Exception:
+            try:
+                os.remove(part)
+            except Exception:
+                pass
+            raise
+        self._commit(folder, filename, size, kind)
+        return path, size
+
+    def _commit(self, folder, filename, size, kind):
+        kind = kind or image_kind(filename) or "other"
+        with self._lock:
+            self._demoting.pop(filename, None)
+            self._add(filename, size, kind)
+            self._append("+", filename, size, kind)
+            self._evict(folder, keep=filename)
+
+    def _delete(self, folder, name):
+        try:
+            os.remove(sharded_path(folder, name))
+        except OSError:
+            pass
+        size, kind = self._remove(name)
+        self._append("-", name)
+        return size
+
+    def _demote(self, folder, name):
+        """Izbacivanje uz premeštanje u trajni nivo; kopiranje radi pozadinski posao"""
+        path = sharded_path(folder, name)
+        try:
+            os.replace(path, path + ".demote")
+        except OSError:
+            return self._delete(folder, name)
+        size, kind = self._remove(name)
+        self._append("-", name)
+        self._demoting[name] = kind
+        if not self._flush_pending:
+            self._flush_pending = True
+            download_pool.submit(self.flush_demoted, priority=PRIORITY_PREFETCH)
+        return size
+
+    def flush_recency(self):
+        """Upisuje LRU redosled u manifest (sažimanjem); iz radnih niti i pri zatvaranju"""
+        with self._lock:
+            self._recency_pending = False
+            if self._touched and self._folder is not None:
+                self._compact()
+
+    def flush_demoted(self):
+        """Prebacuje slike izbačene iz ovog nivoa u trajni i briše ih odavde"""
+        with self._lock:
+            self._flush_pending = False
+            folder = self._folder
+            pending = list(self._demoting.items())
+        for name, kind in pending:
+            path = sharded_path(folder, name) + ".demote"
+            try:
+                if not self.cold.contains(name):
+                    self.cold.import_file(name, path, kind)
+            except Exception as e:
+                print(f"[TMDB] Cache demotion error: {e}")
+            with self._lock:
+                # Ako ju je lookup() u međuvremenu vratio, .demote fajl više ne postoji
+                self._demoting.pop(name, None)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def write_back(self):
+        """Kopira u trajni nivo sve slike koje tamo još nisu (pri zatvaranju plugina)"""
+        if self.cold is None or not self.cold.enabled():
+            return 0
+        with self._lock:
+            folder = self._folder
+            entries = [(name, kind) for name, (_, kind) in self._entries.items()]
+        copied = 0
+        for name, kind in entries:
+            if self.cold.contains(name):
+                continue
+            try:
+                self.cold.import_file(name, sharded_path(folder, name), kind)
+                copied += 1
+            except Exception:
+                pass  # fajl je izbačen u međuvremenu
+        return copied
+
+    def _evict(self, folder, keep=None):
+        budget = self.budget()
+        demote = self.cold is not None and self.cold.enabled()
+        evicted = 0
+        for name in list(self._entries):
+            if self._total <= budget:
+                break
+            if name == keep:
+                continue
+            if demote:
+                self._demote(folder, name)
+            else:
+                self._delete(folder, name)
+            evicted += 1
+        if evicted:
+            print(f"[TMDB] Image cache: evicted {evicted} files, {self._total // 1024} KB in use")
+
+    def trim(self):
+        """Primena novog budžeta bez čekanja na sledeći upis (indeks u izgradnji ga primeni sam)"""
+        if not self._ensure_index(wait=False):
+            return
+        with self._lock:
+            if self._index() is not None:
+                self._evict(self._index())
+
+    def stats(self, kind=None):
+        """(broj fajlova, bajtova) - za sve ili samo jednu vrstu, bez skeniranja foldera"""
+        self._ensure_index()
+        with self._lock:
+            if self._index() is None:
+                return 0, 0
+            if kind is None:
+                return len(self._entries), self._total
+            count, size = self._stats.get(kind, (0, 0))
+            return count, size
+
+    def clear(self, kind=None):
+        """Briše sve slike ili samo jednu vrstu (i u trajnom nivou); vraća (broj, bajtova)"""
+        self._ensure_index()
+        with self._lock:
+            folder = self._index()
+            if folder is None:
+                return 0, 0
+            names = [name for name, (_, k) in self._entries.items() if kind is None or k == kind]
+            freed = 0
+            for name in names:
+                freed += self._delete(folder, name)
+            self._compact()
+        if self.cold is not None:
+            cold_count, cold_freed = self.cold.clear(kind)
+            return len(names) + cold_count, freed + cold_freed
+        return len(names), freed
+
+    def invalidate(self):
+        """Fajlovi su menjani mimo keša - indeks se pravi ponovo iz foldera"""
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            if self._folder is not None:
+                try:
+                    os.remove(os.path.join(self._folder, IMAGE_MANIFEST))
+                except OSError:
+                    pass
+            self._folder = None
+            self._indexed = None
+
+
+# Trajni nivo (HDD/USB); radni nivo je cache_folder, obično /tmp u RAM-u
+cold_image_cache = ImageCache(cold_cache_folder, budget_mb=COLD_CACHE_MAX_MB)
+image_cache = ImageCache(cold=cold_image_cache)
+
+
+def write_back_caches():
+    """Radni nivo -> trajni nivo: pri zatvaranju plugina, povremeno i pri gašenju"""
+    try:
+        images = image_cache.write_back()
+        meta = metadata_cache.write_back()
+        cold_image_cache.flush_recency()
+        if images or meta:
+            print(f"[TMDB] Cache write-back: {images} images, {meta} metadata entries")
+    except Exception as e:
+        print(f"[TMDB] Cache write-back error: {e}")
+
+
+def fetch_tmdb_image(file_path, size, kind=None, timeout=10):
+    """Lokalna putanja TMDB slike; skida je samo ako nije u kešu (blokira - samo iz radne niti)"""
+    filename = image_name(file_path, size)
+    path = image_cache.lookup(filename)
+    if path:
+        return path
+    # Ceo download+upis je jedan let, pa dva ekrana ne upisuju isti fajl istovremeno
+    return image_flight.do(filename, _fetch_tmdb_image, file_path, size, filename, kind, timeout)
+
+
+def _fetch_tmdb_image(file_path, size, filename, kind, timeout):
+    path = image_cache.lookup(filename, promote=True)
+    if path:
+        return path
+    started = time.time()
+    path, nbytes = image_cache.download(filename, TMDB_IMAGE_BASE + size + file_path, kind, timeout)
+    throughput.record(nbytes, time.time() - started)
+    return path
+
+# ---------- IMAGE SIZE SELECTION ----------
+# TMDB veličine po vrsti slike, od najmanje ka najvećoj.
+# "original" namerno izostaje - backdrop original je često 4K i više MB.
+IMAGE_LADDERS = {
+    "poster": ("w185", "w342", "w500", "w780"),
+    "backdrop": ("w300", "w780", "w1280"),
+    "profile": ("w185", "h632"),
+}
+# Mali pregled koji se prikazuje dok puna slika stiže
+PREVIEW_SIZES = {"poster": "w185", "backdrop": "w300", "profile": "w185"}
+IMAGE_TIME_BUDGET = 2.0      # sekundi koje jedna slika sme da se skida
+JPEG_BYTES_PER_PIXEL = 0.25  # prosek za TMDB JPEG-ove
+
+
+class ThroughputMeter(object):
+    """EWMA brzine skidanja slika (bajtova u sekundi)"""
+
+    MIN_SAMPLE = 16 * 1024  # manji fajlovi mere latenciju, ne protok
+    ALPHA = 0.3
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rate = None
+
+    def record(self, nbytes, seconds):
+        if nbytes < self.MIN_SAMPLE or seconds <= 0:
+            return
+        sample = nbytes / seconds
+        with self._lock:
+            self.rate = sample if self.rate is None else self.rate + self.ALPHA * (sample - self.rate)
+
+
+throughput = ThroughputMeter()
+
+
+def _ladder_pixels(size, aspect):
+    """Procena broja piksela za TMDB veličinu (wN = širina, hN = visina)"""
+    n = int(size[1:])
+    return n * n * aspect if size[0] == "w" else n * n / aspect
+
+
+def ideal_image_size(target):
+    """Najmanja TMDB veličina koja pokriva widget cilja"""
+    ladder, width, height, _, _ = IMAGE_TARGETS[target]
+    sizes = IMAGE_LADDERS[ladder]
+    for size in sizes:
+        if int(size[1:]) >= (width if size[0] == "w" else height):
+            return size
+    return sizes[-1]
+
+
+def choose_image_size(target):
+    """Idealna veličina, ili manja ako izmereni protok ne stiže u IMAGE_TIME_BUDGET"""
+    ladder, width, height, _, _ = IMAGE_TARGETS[target]
+    sizes = IMAGE_LADDERS[ladder]
+    idx = sizes.index(ideal_image_size(target))
+    rate = throughput.rate
+    if rate is None:
+        return sizes[idx]
+    aspect = float(height) / width
+    while idx > 0 and _ladder_pixels(sizes[idx], aspect) * JPEG_BYTES_PER_PIXEL / rate > IMAGE_TIME_BUDGET:
+        idx -= 1
+    return sizes[idx]
+
+# ---------- IMAGE VARIANTS ----------
+# cilj -> (lestvica veličina, širina, visina, crop, vrsta); dimenzije prate widgete iz skinova.
+# crop=True popunjava widget i seče višak (kao setScale(2)), inače slika staje unutra.
+IMAGE_TARGETS = {
+    "poster": ("poster", 500, 750, False, "poster"),
+    "person": ("profile", 500, 750, False, "person"),
+    "backdrop": ("backdrop", 1200, 720, True, "backdrop"),
+    "gallery_poster": ("poster", 600, 900, True, "gallery"),
+    "gallery_backdrop": ("backdrop", 1820, 900, True, "gallery"),
+}
+
+
+def image_size(path):
+    """(širina, visina) iz zaglavlja JPEG/PNG fajla, bez dekodiranja; None ako nije poznato"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(24)
+            if head.startswith(b"\x89PNG"):
+                return struct.unpack(">II", head[16:24])
+            if not head.startswith(b"\xff\xd8"):
+                return None
+            f.seek(2)
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return None
+                # SOF0..SOF15 nose dimenzije; C4 (DHT), C8 i CC nisu SOF
+                if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                    f.read(3)
+                    height, width = struct.unpack(">HH", f.read(4))
+                    return width, height
+                length = struct.unpack(">H", f.read(2))[0]
+                f.seek(length - 2, 1)
+    except Exception:
+        return None
+
+
+def fits_widget(path, target):
+    """True ako se slika prikazuje bez skaliranja u widgetu cilja"""
+    _, width, height, crop, _ = IMAGE_TARGETS[target]
+    size = image_size(path)
+    if not size:
+        return False
+    if crop:
+        return size == (width, height)
+    return size[0] <= width and size[1] <= height and (size[0] == width or size[1] == height)
+
+
+def variant_name(filename, target):
+    _, width, height, _, _ = IMAGE_TARGETS[target]
+    return f"{width}x{height}_{filename}"
+
+
+def image_variant(path, target):
+    """Varijanta slike skalirana na widget cilja (baseline JPEG); original ako nema Pillow-a"""
+    name = variant_name(os.path.basename(path), target)
+    cached = image_cache.lookup(name, promote=True)
+    if cached:
+        return cached
+    if Image is None or fits_widget(path, target):
+        return path
+    _, width, height, crop, kind = IMAGE_TARGETS[target]
+    try:
+        img = Image.open(path)
+        img.draft("RGB", (width, height))  # JPEG se dekodira odmah u manjoj rezoluciji
+        img = img.convert("RGB")
+        pick = max if crop else min
+        scale = pick(float(width) / img.width, float(height) / img.height)
+        resized = (max(1, int(round(img.width * scale))), max(1, int(round(img.height * scale))))
+        img = img.resize(resized, Image.BILINEAR)
+        if crop:
+            left = (resized[0] - width) // 2
+            top = (resized[1] - height) // 2
+            img = img.crop((left, top, left + width, top + height))
+        buf = BytesIO()
+        img.save(buf, "JPEG", quality=88)
+        return image_cache.store(name, buf.getvalue(), kind)
+    except Exception as e:
+        print(f"[TMDB] Image variant error: {e}")
+        return path
+
+
+def fetch_tmdb_image_for(file_path, target, timeout=10, upgrade=None, preview=None):
+    """Skida (ili uzima iz keša) sliku za dati widget i vraća putanju spremnu za prikaz.
+
+    Ako je zbog spore veze izabrana manja veličina, a upgrade je uključen,
+    puna veličina se skida u pozadini i predaje `upgrade(path)`. Sa
+    `preview` (i progresivnim režimom) se pre pune slike skida mali pregled
+    i predaje `preview(path)`; otkazivanje tokena tada prekida punu sliku.
+    """
+    ladder, _, _, _, kind = IMAGE_TARGETS[target]
+    ideal = ideal_image_size(target)
+    path = _cached_image(file_path, ideal, target, promote=True)
+    if path:
+        return path
+    # Manja veličina koja je već u kešu (ranije skinuta na sporoj vezi)
+    path = cached_image_for(file_path, target, promote=True)
+    if path is None:
+        size = choose_image_size(target)
+        small = PREVIEW_SIZES[ladder]
+        if preview is not None and config.plugins.ciefptmdb.progressive_images.value and size != small:
+            try:
+                # Pregled ide bez varijante - widget ga skalira, a puna slika ga ionako menja
+                preview(fetch_tmdb_image(file_path, small, kind, min(timeout, 5)))
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                print(f"[TMDB] Preview download error: {e}")
+        path = image_variant(fetch_tmdb_image(file_path, size, kind, timeout), target)
+        if size == ideal:
+            return path
+    if upgrade is not None and config.plugins.ciefptmdb.image_upgrade.value:
+        def upgrade_job():
+            upgrade(image_variant(fetch_tmdb_image(file_path, ideal, kind, timeout * 2), target))
+        download_pool.submit(upgrade_job, priority=PRIORITY_PREFETCH, token=current_token())
+    return path
+
+
+def _cached_image(file_path, size, target, promote=False):
+    filename = image_name(file_path, size)
+    path = image_cache.lookup(variant_name(filename, target), promote)
+    if path:
+        return path
+    path = image_cache.lookup(filename, promote)
+    if path and (Image is None or fits_widget(path, target)):
+        return path
+    return None
+
+
+def cached_image_for(file_path, target, promote=False):
+    """Sinhrona provera keša: najveća keširana veličina između izabrane i idealne.
+
+    Manji pregledi (PREVIEW_SIZES) se ne računaju, da ne bi zauvek zamenili punu sliku.
+    Iz main loop-a samo radni nivo; promote=True gleda i disk (radne niti).
+    """
+    sizes = IMAGE_LADDERS[IMAGE_TARGETS[target][0]]
+    lowest = sizes.index(choose_image_size(target))
+    for size in reversed(sizes[lowest:sizes.index(ideal_image_size(target)) + 1]):
+        path = _cached_image(file_path, size, target, promote)
+        if path:
+            return path
+    return None
+
+# ---------- MAIN THREAD DISPATCH ----------
+class MainThreadDispatcher(object):
+    """Prenosi rezultate iz radnih niti u Enigma2 main loop.
+
+    Niti samo upisuju bajt u pipe koji prati eSocketNotifier; main loop
+    zatim u jednom prolazu izvrši sve pristigle pozive. Poziv sa istim
+    `key` zamenjuje prethodni koji još čeka, pa se widget ažurira jednom.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()
+        self._seq = itertools.count()
+        self._signalled = False
+        self._rfd, self._wfd = os.pipe()
+        os.set_blocking(self._rfd, False)
+        os.set_blocking(self._wfd, False)
+        self._notifier = eSocketNotifier(self._rfd, eSocketNotifier.Read)
+        self._notifier.callback.append(self._drain)
+
+    def post(self, fn, *args, key=None):
+        with self._lock:
+            if key is None:
+                key = next(self._seq)
+            else:
+                self._pending.pop(key, None)
+            self._pending[key] = (fn, args)
+            if self._signalled:
+                return
+            self._signalled = True
+        try:
+            os.write(self._wfd, b"!")
+        except OSError:
+            pass
+
+    def _drain(self, what=None):
+        try:
+            os.read(self._rfd, 512)
+        except OSError:
+            pass
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+            self._signalled = False
+        for fn, args in pending.values():
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"[TMDB] UI update error: {e}")
+
+
+main_dispatcher = MainThreadDispatcher()
+
+
+def run_on_main(fn, *args, key=None):
+    main_dispatcher.post(fn, *args, key=key)
+
+
+def main_thread_callback(callback, key=None):
+    """Omotava callback tako da se uvek izvrši u main loop-u"""
+    def posted(*args):
+        main_dispatcher.post(callback, *args, key=key)
+    return posted
+
+# ---------- DOWNLOAD WORKER POOL ----------
+PRIORITY_INTERACTIVE = 0  # poster na ekranu, IMDB ocena
+PRIORITY_BACKDROP = 1
+PRIORITY_PREFETCH = 2     # pozadinsko punjenje keša
+DOWNLOAD_WORKERS = 2
+
+
+class DownloadJob(object):
+    def __init__(self, fn, args, priority, slot, token):
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.slot = slot
+        self.token = token
+        self._cancelled = False
+
+    @property
+    def cancelled(self):
+        return self._cancelled or (self.token is not None and self.token.cancelled)
+
+    def cancel(self):
+        self._cancelled = True
+
+
+class DownloadPool(object):
+    """Fiksan broj radnih niti sa prioritetnim redom.
+
+    Posao predat sa istim `slot`-om (npr. "poster") potiskuje prethodni
+    koji još čeka u redu, pa se zastareli download nikad ne pokrene.
+    """
+
+    def __init__(self, workers=DOWNLOAD_WORKERS):
+        self._cond = threading.Condition()
+        self._queue = []  # heap: (priority, seq, job)
+        self._seq = itertools.count()
+        self._slots = {}
+        self._size = workers
+        self._threads = []
+
+    def submit(self, fn, *args, priority=PRIORITY_INTERACTIVE, slot=None, token=None):
+        job = DownloadJob(fn, args, priority, slot, token)
+        with self._cond:
+            if slot is not None:
+                old = self._slots.get(slot)
+                if old is not None:
+                    old.cancel()
+                self._slots[slot] = job
+            heapq.heappush(self._queue, (priority, next(self._seq), job))
+            if len(self._threads) < self._size:
+                thread = threading.Thread(target=self._worker, daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+        return job
+
+    def cancel_slot(self, slot):
+        with self._cond:
+            job = self._slots.pop(slot, None)
+        if job is not None:
+            job.cancel()
+
+    def pending(self):
+        with self._cond:
+            return sum(1 for _, _, job in self._queue if not job.cancelled)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._queue)
+                if job.slot is not None and self._slots.get(job.slot) is job:
+                    del self._slots[job.slot]
+            if job.cancelled:
+                continue
+            _request_context.token = job.token
+            _request_context.priority = job.priority
+            try:
+                job.fn(*job.args)
+            except RequestCancelled:
+                pass
+            except Exception as e:
+                print(f"[TMDB] Worker job error: {e}")
+            finally:
+                _request_context.token = None
+                _request_context.priority = 0
+
+
+download_pool = DownloadPool()
+
 # ---------- TMDB helpers ----------
 def _search_tmdb_movie(title, year=None, api_key=None):
     if not api_key:
@@ -213,13 +2269,11 @@ def _search_tmdb_movie(title, year=None, api_key=None):
         if year:
             params["year"] = year
         url = "https://api.themoviedb.org/3/search/movie?" + urllib.parse.urlencode(params)
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=10)
         results = data.get("results", [])
         return (results[0], "movie") if results else (None, None)
+    except RequestCancelled:
+        raise
     except Exception as e:
         print(f"[TMDB] Movie search error: {e}")
         return None, None
@@ -233,67 +2287,328 @@ def _search_tmdb_tv(title, year=None, api_key=None):
         if year:
             params["first_air_date_year"] = year
         url = "https://api.themoviedb.org/3/search/tv?" + urllib.parse.urlencode(params)
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=10)
         results = data.get("results", [])
         return (results[0], "tv") if results else (None, None)
+    except RequestCancelled:
+        raise
     except Exception as e:
         print(f"[TMDB] TV search error: {e}")
         return None, None
 
 
-def _search_tmdb_multi(title, year=None, api_key=None):
-    if not api_key:
-        return None, None
-    try:
-        language = config.plugins.ciefptmdb.language.value
-        params = {"api_key": api_key, "query": title, "language": language,
-                  "include_adult": "false"}  # Isključi adult da izbegneš gluposti
-        if year:
-            params["year"] = year  # Za filmove, ili first_air_date_year za TV, ali multi podržava oba
-        url = "https://api.themoviedb.org/3/search/multi?" + urllib.parse.urlencode(params)
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
-        results = data.get("results", [])
-        if not results:
-            return None, None
+def _search_tmdb_multi(title, year=None, api_key=None):
+    if not api_key:
+        return None, None
+    try:
+        language = config.plugins.ciefptmdb.language.value
+        params = {"api_key": api_key, "query": title, "language": language,
+                  "include_adult": "false"}  # Isključi adult da izbegneš gluposti
+        if year:
+            params["year"] = year  # Za filmove, ili first_air_date_year za TV, ali multi podržava oba
+        url = "https://api.themoviedb.org/3/search/multi?" + urllib.parse.urlencode(params)
+        data = fetch_json(url, timeout=10)
+        results = data.get("results", [])
+        if not results:
+            return None, None
+
+        # Filtriraj samo movie i tv, odaberi prvi sa najvećom popularity (ili samo prvi, jer TMDB sortira)
+        valid_results = [r for r in results if r.get("media_type") in ["movie", "tv"]]
+        if valid_results:
+            # Ako ima year, prioritet match-u
+            if year:
+                for res in valid_results:
+                    res_year = res.get("release_date", "")[:4] if res["media_type"] == "movie" else res.get(
+                        "first_air_date", "")[:4]
+                    if res_year == str(year):
+                        return res, res["media_type"]
+            # Inače, uzmi prvi (najpopularniji)
+            best = valid_results[0]
+            return best, best["media_type"]
+        return None, None
+    except RequestCancelled:
+        raise
+    except Exception as e:
+        print(f"[TMDB] Multi search error: {e}")
+        return None, None
+
+
+def search_media_with_fallback(title, year, api_key):
+    """Najbolji mogući search – koristi /search/multi + pametan fallback"""
+    try:
+        language = config.plugins.ciefptmdb.language.value
+        params = {
+            "api_key": api_key,
+            "query": title,
+            "language": language,
+            "include_adult": "false"
+        }
+        if year:
+            params["year"] = year
+
+        url = "https://api.themoviedb.org/3/search/multi?" + urllib.parse.urlencode(params)
+        data = fetch_json(url, timeout=12)
+
+        results = data.get("results", [])
+        if not results:
+            return None, None
+
+        candidates = [r for r in results if r.get("media_type") in ("movie", "tv")]
+        if not candidates:
+            return None, None
+
+        if year:
+            for c in candidates:
+                c_year = (c.get("release_date") or c.get("first_air_date") or "")[:4]
+                if c_year == str(year):
+                    return c, c["media_type"]
+
+        candidates.sort(key=lambda x: x.get("popularity", 0), reverse=True)
+        best = candidates[0]
+
+        if best["media_type"] == "movie":
+            temp_details = _get_media_details(best["id"], "movie", api_key)
+            runtime = temp_details.get("runtime") if temp_details else 0
+            if runtime and runtime < 35:
+                tv_result = _search_tmdb_tv(title, year, api_key)
+                if tv_result[0]:
+                    return tv_result
+
+        return best, best["media_type"]
+
+    except RequestCancelled:
+        raise
+    except Exception as e:
+        print(f"[TMDB] Multi search error: {e}")
+        result, mtype = _search_tmdb_movie(title, year, api_key)
+        if result:
+            return result, mtype
+        return _search_tmdb_tv(title, year, api_key)
+
+
+# Sve što ekran detalja, galerije i IMDB ocena trebaju - u jednom zahtevu
+DETAILS_APPEND = "credits,images,external_ids"
+
+
+def _get_media_details(media_id, media_type, api_key):
+    try:
+        language = config.plugins.ciefptmdb.language.value
+        params = {
+            "api_key": api_key,
+            "language": language,
+            "append_to_response": DETAILS_APPEND,
+            # images bez ovoga vraća samo slike na jeziku opisa; galerija
+            # backdropa koristi ovaj izbor, a galerija postera ceo /images
+            "include_image_language": f"{language[:2]},en,null",
+        }
+        url = f"https://api.themoviedb.org/3/{media_type}/{media_id}?" + urllib.parse.urlencode(params)
+        return fetch_json(url, timeout=10)
+    except RequestCancelled:
+        raise
+    except Exception as e:
+        print(f"[TMDB] Details error: {e}")
+        return None
+
+# ---------- EPG PREFETCH ----------
+EPG_PREFETCH_DELAY = 60 * 1000          # prvi prolaz posle starta sesije (ms)
+EPG_PREFETCH_INTERVAL = 10 * 60 * 1000
+EPG_PREFETCH_BUSY_RETRY = 30 * 1000     # red poslova nije prazan - probaj kasnije
+PREFETCH_REMEMBER = 1000                # toliko već razrešenih naslova se pamti
+ZAP_PREFETCH_AHEAD = 2                  # kanala unapred u smeru zapovanja
+ZAP_SETTLE_MS = 500                     # pretraga kreće tek kada zapovanje stane toliko (ms)
+
+# (naslov, godina) -> pronađen na TMDB-u; zajedničko za EPG prefetch i indekser bukea
+prefetched_titles = OrderedDict()
+
+
+def in_standby():
+    try:
+        import Screens.Standby
+        return bool(Screens.Standby.inStandby)
+    except Exception:
+        return False
+
+
+def prefetch_media(title, year, api_key):
+    """Razrešava naslov u metadata keš i skida poster i backdrop (samo iz radne niti)"""
+    found = _prefetch_media(title, year, api_key)
+    # Pretraga guta greške - otkazan posao ne sme da se zapamti kao "nije pronađen"
+    token = current_token()
+    if token is not None:
+        token.raise_if_cancelled()
+    prefetched_titles[(title, year)] = found
+    while len(prefetched_titles) > PREFETCH_REMEMBER:
+        prefetched_titles.popitem(last=False)
+    return found
+
+
+def _prefetch_media(title, year, api_key):
+    result, media_type = search_media_with_fallback(title, year, api_key)
+    if not result:
+        return False
+    details = _get_media_details(result["id"], media_type, api_key)
+    if not details:
+        return False
+    if config.plugins.ciefptmdb.cache_enabled.value:
+        for field, target in (("poster_path", "poster"), ("backdrop_path", "backdrop")):
+            if not details.get(field):
+                continue
+            try:
+                fetch_tmdb_image_for(details[field], target)
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                print(f"[TMDB] Prefetch image error: {e}")
+    return True
+
+
+class EPGPrefetcher(object):
+    """Unapred razrešava naredne EPG emisije kanala koji se gleda.
+
+    eTimer povremeno, i samo kada je red poslova prazan, čita narednih N
+    događaja iz eEPGCache; radna nit ih jedan po jedan, sa najnižim
+    prioritetom, razrešava u metadata i image keš, pa je plugin na početku
+    sledeće emisije već topao.
+    """
+
+    def __init__(self):
+        self.timer = eTimer()
+        self.timer.timeout.get().append(self._tick)
+        self.token = None
+
+    def start(self, delay=EPG_PREFETCH_DELAY):
+        self.timer.start(delay, True)
+
+    def stop(self):
+        self.timer.stop()
+        if self.token is not None:
+            self.token.cancel()
+
+    def _tick(self):
+        self.timer.start(EPG_PREFETCH_INTERVAL, True)
+        count = int(config.plugins.ciefptmdb.epg_prefetch.value)
+        api_key = config.plugins.ciefptmdb.tmdb_api_key.value.strip()
+        if not count or not api_key or in_standby():
+            return
+        if download_pool.pending():
+            self.timer.start(EPG_PREFETCH_BUSY_RETRY, True)
+            return
+        todo = []
+        for event in get_upcoming_epg_events(count):
+            title, year = parse_epg_title(event['name'], event['short'] + " " + event['ext'])
+            if title and (title, year) not in prefetched_titles and (title, year) not in todo:
+                todo.append((title, year))
+        if not todo:
+            return
+        if self.token is not None:
+            self.token.cancel()
+        self.token = CancelToken()
+        download_pool.submit(self._step, todo[::-1], api_key, priority=PRIORITY_PREFETCH, token=self.token)
+
+    def _step(self, todo, api_key):
+        """Jedan naslov po poslu; sledeći ide na kraj reda, iza interaktivnih poslova"""
+        title, year = todo.pop()
+        found = prefetch_media(title, year, api_key)
+        print(f"[TMDB] EPG prefetch: {title}" + (f" ({year})" if year else "") + ("" if found else " - not found"))
+        if todo:
+            download_pool.submit(self._step, todo, api_key, priority=PRIORITY_PREFETCH, token=current_token())
+
+
+epg_prefetcher = None
+
+# ---------- BOUQUET INDEXER ----------
+INDEX_DELAY = 3 * 60 * 1000         # posle prvog EPG prefetch-a, da ne kreću zajedno
+INDEX_INTERVAL = 30 * 60 * 1000
+
+
+class BouquetIndexer(object):
+    """Puni keš za trenutne i sledeće emisije svih kanala iz bukea.
+
+    Radi u zajedničkom download_pool-u sa najnižim prioritetom: svaki posao
+    razreši jedan naslov i preda sledeći na kraj reda, pa interaktivni
+    poslovi uvek ulaze između. Lanaca je najviše DOWNLOAD_WORKERS - 1, pa
+    bar jedna nit uvek ostaje slobodna za korisnika. Svaki prolaz
+    ima budžet mrežnih zahteva; kada se potroši, token se otkazuje i
+    ostatak čeka sledeći prolaz.
+    """
+
+    def __init__(self):
+        self.timer = eTimer()
+        self.timer.timeout.get().append(self._tick)
+        self.token = None
+        self._lock = threading.Lock()
+        self._todo = []
+        self._active = 0
+        self._resolved = 0
+        self._started = 0
+
+    def start(self, delay=INDEX_DELAY):
+        self.timer.start(delay, True)
+
+    def stop(self):
+        self.timer.stop()
+        if self.token is not None:
+            self.token.cancel()
+
+    def running(self):
+        # Posao otkazanog prolaza pool preskače, pa njegov brojač više ne važi
+        return self.token is not None and not self.token.cancelled and self._active > 0
+
+    def _tick(self):
+        self.timer.start(INDEX_INTERVAL, True)
+        chains = min(int(config.plugins.ciefptmdb.index_workers.value), DOWNLOAD_WORKERS - 1)
+        api_key = config.plugins.ciefptmdb.tmdb_api_key.value.strip()
+        if not chains or not api_key or in_standby() or self.running():
+            return
+        todo = []
+        for event in get_now_next_events(get_bouquet_services()):
+            key = parse_epg_title(event['name'], event['short'] + " " + event['ext'])
+            if key[0] and key not in prefetched_titles and key not in todo:
+                todo.append(key)
+        if not todo:
+            return
+        token = self.token = CancelToken(budget=int(config.plugins.ciefptmdb.index_budget.value))
+        with self._lock:
+            self._todo = todo[::-1]  # pop() sa kraja ide redom kanala u bukeu
+            self._resolved = 0
+            self._started = time.time()
+            self._active = min(chains, len(todo))
+        print(f"[TMDB] Bouquet index: {len(todo)} titles, {self._active} parallel")
+        for _ in range(self._active):
+            download_pool.submit(self._step, api_key, priority=PRIORITY_PREFETCH, token=token)
+
+    def _step(self, api_key):
+        token = current_token()
+        with self._lock:
+            item = self._todo.pop() if self._todo and token is self.token else None
+        if item is None:
+            self._chain_done(token)
+            return
+        try:
+            if prefetch_media(item[0], item[1], api_key):
+                with self._lock:
+                    self._resolved += 1
+        except RequestCancelled:
+            self._chain_done(token)
+            raise
+        except Exception as e:
+            print(f"[TMDB] Bouquet index error: {e}")
+        # Sledeći naslov ide na kraj reda, iza interaktivnih poslova
+        download_pool.submit(self._step, api_key, priority=PRIORITY_PREFETCH, token=token)
+
+    def _chain_done(self, token):
+        with self._lock:
+            if token is not self.token:
+                return
+            self._active -= 1
+            if self._active:
+                return
+            left = len(self._todo)
+            self._todo = []
+        print(f"[TMDB] Bouquet index: {self._resolved} resolved, {left} left for next pass ({time.time() - self._started:.0f}s)")
+
 
-        # Filtriraj samo movie i tv, odaberi prvi sa najvećom popularity (ili samo prvi, jer TMDB sortira)
-        valid_results = [r for r in results if r.get("media_type") in ["movie", "tv"]]
-        if valid_results:
-            # Ako ima year, prioritet match-u
-            if year:
-                for res in valid_results:
-                    res_year = res.get("release_date", "")[:4] if res["media_type"] == "movie" else res.get(
-                        "first_air_date", "")[:4]
-                    if res_year == str(year):
-                        return res, res["media_type"]
-            # Inače, uzmi prvi (najpopularniji)
-            best = valid_results[0]
-            return best, best["media_type"]
-        return None, None
-    except Exception as e:
-        print(f"[TMDB] Multi search error: {e}")
-        return None, None
-        
-def _get_media_details(media_id, media_type, api_key):
-    try:
-        language = config.plugins.ciefptmdb.language.value
-        url = f"https://api.themoviedb.org/3/{media_type}/{media_id}?api_key={api_key}&language={language}&append_to_response=credits"
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            return json.loads(resp.read().decode("utf-8", errors="ignore"))
-    except Exception as e:
-        print(f"[TMDB] Details error: {e}")
-        return None
+bouquet_indexer = None
 
 # ---------- TMDB ADVANCED SEARCH POPULAR ----------
 def get_popular_movies(api_key, page=1):
@@ -301,11 +2616,7 @@ def get_popular_movies(api_key, page=1):
     try:
         language = config.plugins.ciefptmdb.language.value
         url = f"https://api.themoviedb.org/3/movie/popular?api_key={api_key}&language={language}&page={page}"
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=10)
         return data.get("results", [])[:20]  # Vrati maksimalno 20
     except Exception as e:
         print(f"[TMDB] Popular movies error: {e}")
@@ -316,11 +2627,7 @@ def get_popular_tv(api_key, page=1):
     try:
         language = config.plugins.ciefptmdb.language.value
         url = f"https://api.themoviedb.org/3/tv/popular?api_key={api_key}&language={language}&page={page}"
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=10)
         return data.get("results", [])[:20]
     except Exception as e:
         print(f"[TMDB] Popular TV error: {e}")
@@ -331,11 +2638,7 @@ def get_popular_persons(api_key, page=1):
     try:
         language = config.plugins.ciefptmdb.language.value
         url = f"https://api.themoviedb.org/3/person/popular?api_key={api_key}&language={language}&page={page}"
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=10)
         return data.get("results", [])[:20]
     except Exception as e:
         print(f"[TMDB] Popular persons error: {e}")
@@ -346,11 +2649,7 @@ def get_trending_all(api_key, time_window="day"):
     try:
         language = config.plugins.ciefptmdb.language.value
         url = f"https://api.themoviedb.org/3/trending/all/{time_window}?api_key={api_key}&language={language}"
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=10)
         return data.get("results", [])[:20]
     except Exception as e:
         print(f"[TMDB] Trending error: {e}")
@@ -361,11 +2660,7 @@ def get_top_rated_movies(api_key, page=1):
     try:
         language = config.plugins.ciefptmdb.language.value
         url = f"https://api.themoviedb.org/3/movie/top_rated?api_key={api_key}&language={language}&page={page}"
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=10)
         return data.get("results", [])[:20]
     except Exception as e:
         print(f"[TMDB] Top rated movies error: {e}")
@@ -376,11 +2671,7 @@ def get_top_rated_tv(api_key, page=1):
     try:
         language = config.plugins.ciefptmdb.language.value
         url = f"https://api.themoviedb.org/3/tv/top_rated?api_key={api_key}&language={language}&page={page}"
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=10)
         return data.get("results", [])[:20]
     except Exception as e:
         print(f"[TMDB] Top rated TV error: {e}")
@@ -391,32 +2682,25 @@ def get_upcoming_movies(api_key, page=1):
     try:
         language = config.plugins.ciefptmdb.language.value
         url = f"https://api.themoviedb.org/3/movie/upcoming?api_key={api_key}&language={language}&page={page}"
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=10)
         return data.get("results", [])[:20]
     except Exception as e:
         print(f"[TMDB] Upcoming movies error: {e}")
         return []
 
 # ---------- NOVO: BACKDROPS & POSTERS GALERIJA ----------
+def sort_images(images):
+    """Sortira slike po popularnosti (vote_average * vote_count); vraća novu listu"""
+    return sorted(images or [], key=lambda x: (x.get("vote_average", 0) * x.get("vote_count", 0)), reverse=True)
+
 def get_all_backdrops(media_id, media_type, api_key):
     """Dobija sve backdrop slike za film/seriju"""
     try:
         language = config.plugins.ciefptmdb.language.value
         url = f"https://api.themoviedb.org/3/{media_type}/{media_id}/images?api_key={api_key}"
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=10)
         
-        backdrops = data.get("backdrops", [])
-        # Sortiraj po popularnosti (vote_average + vote_count)
-        backdrops.sort(key=lambda x: (x.get("vote_average", 0) * x.get("vote_count", 0)), reverse=True)
-        return backdrops
+        return sort_images(data.get("backdrops"))
     except Exception as e:
         print(f"[TMDB] Get all backdrops error: {e}")
         return []
@@ -426,16 +2710,9 @@ def get_all_posters(media_id, media_type, api_key):
     try:
         language = config.plugins.ciefptmdb.language.value
         url = f"https://api.themoviedb.org/3/{media_type}/{media_id}/images?api_key={api_key}"
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=10)
         
-        posters = data.get("posters", [])
-        # Sortiraj po popularnosti
-        posters.sort(key=lambda x: (x.get("vote_average", 0) * x.get("vote_count", 0)), reverse=True)
-        return posters
+        return sort_images(data.get("posters"))
     except Exception as e:
         print(f"[TMDB] Get all posters error: {e}")
         return []
@@ -446,11 +2723,7 @@ def get_tv_seasons(tv_id, api_key):
     try:
         language = config.plugins.ciefptmdb.language.value
         url = f"https://api.themoviedb.org/3/tv/{tv_id}?api_key={api_key}&language={language}"
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=10)
         return data.get("seasons", [])
     except Exception as e:
         print(f"[TMDB] Get seasons error: {e}")
@@ -461,11 +2734,7 @@ def get_season_episodes(tv_id, season_number, api_key):
     try:
         language = config.plugins.ciefptmdb.language.value
         url = f"https://api.themoviedb.org/3/tv/{tv_id}/season/{season_number}?api_key={api_key}&language={language}"
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=10)
         return data.get("episodes", [])
     except Exception as e:
         print(f"[TMDB] Get episodes error: {e}")
@@ -476,11 +2745,7 @@ def get_episode_details(tv_id, season_number, episode_number, api_key):
     try:
         language = config.plugins.ciefptmdb.language.value
         url = f"https://api.themoviedb.org/3/tv/{tv_id}/season/{season_number}/episode/{episode_number}?api_key={api_key}&language={language}"
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            return json.loads(resp.read().decode("utf-8", errors="ignore"))
+        return fetch_json(url, timeout=10)
     except Exception as e:
         print(f"[TMDB] Get episode details error: {e}")
         return None
@@ -494,11 +2759,7 @@ def _search_tmdb_person(name, api_key=None):
         language = config.plugins.ciefptmdb.language.value
         params = {"api_key": api_key, "query": name, "language": language}
         url = "https://api.themoviedb.org/3/search/person?" + urllib.parse.urlencode(params)
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=10)
         results = data.get("results", [])
         return (results[0], "person") if results else (None, None)
     except Exception as e:
@@ -511,18 +2772,17 @@ def _get_person_details(person_id, api_key):
     try:
         language = config.plugins.ciefptmdb.language.value
         url = f"https://api.themoviedb.org/3/person/{person_id}?api_key={api_key}&language={language}&append_to_response=movie_credits,tv_credits"
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=10) as resp:
-            return json.loads(resp.read().decode("utf-8", errors="ignore"))
+        return fetch_json(url, timeout=10)
     except Exception as e:
         print(f"[TMDB] Person details error: {e}")
         return None
 
 
-def download_person_photo_async(profile_path, person_id, callback):
+def download_person_photo_async(profile_path, person_id, callback, priority=PRIORITY_INTERACTIVE, slot=None, token=None):
     """Download slike glumca/direktora"""
+    if token is not None:
+        callback = token.guard(callback)
+    callback = main_thread_callback(callback, key=("download", slot) if slot else None)
     if not profile_path or not person_id:
         callback(None)
         return
@@ -532,29 +2792,12 @@ def download_person_photo_async(profile_path, person_id, callback):
 
     def download_thread():
         try:
-            filename = f"person_{person_id}_{os.path.basename(profile_path)}"
-            folder = ensure_cache_folder()
-            fname = os.path.join(folder, filename)
-
-            if os.path.exists(fname):
-                callback(fname)
-                return
-
-            base = "https://image.tmdb.org/t/p/h632"  # Optimalna veličina za profile
-            url = base + profile_path
-            ctx = ssl.create_default_context()
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
-            data = urllib.request.urlopen(url, context=ctx, timeout=8).read()
-            with open(fname, "wb") as f:
-                f.write(data)
-            callback(fname)
+            callback(fetch_tmdb_image_for(profile_path, "person", timeout=8, upgrade=callback))
         except Exception as e:
             print(f"[TMDB] Person photo download error: {e}")
             callback(None)
 
-    thread = threading.Thread(target=download_thread, daemon=True)
-    thread.start()
+    download_pool.submit(download_thread, priority=priority, slot=slot, token=token)
 
 # ---------- OMDb helpers ----------
 def _search_omdb(title, year=None, api_key=None):
@@ -566,11 +2809,7 @@ def _search_omdb(title, year=None, api_key=None):
             params["y"] = year
             
         url = "http://www.omdbapi.com/?" + urllib.parse.urlencode(params)
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        with urllib.request.urlopen(url, context=ctx, timeout=8) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+        data = fetch_json(url, timeout=8)
         
         # Proveri da li je odgovor uspešan
         if data.get("Response") == "True":
@@ -591,17 +2830,13 @@ def get_imdb_rating(media_info, media_type, api_key):
     if not title:
         return None
         
-    # Prvo pokušaj sa IMDB ID ako ga imamo
-    imdb_id = media_info.get("imdb_id")
+    # Prvo pokušaj sa IMDB ID ako ga imamo (serije ga imaju samo u external_ids)
+    imdb_id = media_info.get("imdb_id") or (media_info.get("external_ids") or {}).get("imdb_id")
     if imdb_id:
         try:
             params = {"apikey": api_key, "i": imdb_id, "r": "json"}
             url = "http://www.omdbapi.com/?" + urllib.parse.urlencode(params)
-            ctx = ssl.create_default_context()
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
-            with urllib.request.urlopen(url, context=ctx, timeout=8) as resp:
-                data = json.loads(resp.read().decode("utf-8", errors="ignore"))
+            data = fetch_json(url, timeout=8)
             
             if data.get("Response") == "True" and data.get("imdbRating") not in ["N/A", ""]:
                 return data.get("imdbRating")
@@ -615,7 +2850,10 @@ def get_imdb_rating(media_info, media_type, api_key):
     
     return None
 
-def download_poster_async(poster_path, media_id, media_type, callback):
+def download_poster_async(poster_path, media_id, media_type, callback, priority=PRIORITY_INTERACTIVE, slot=None, token=None):
+    if token is not None:
+        callback = token.guard(callback)
+    callback = main_thread_callback(callback, key=("download", slot) if slot else None)
     if not poster_path or not media_id:
         callback(None)
         return
@@ -624,26 +2862,11 @@ def download_poster_async(poster_path, media_id, media_type, callback):
         return
     def download_thread():
         try:
-            filename = ("movie_" if media_type == "movie" else "tv_") + f"{media_id}_{os.path.basename(poster_path)}"
-            folder = ensure_cache_folder()
-            fname = os.path.join(folder, filename)
-            if os.path.exists(fname):
-                callback(fname)
-                return
-            base = "https://image.tmdb.org/t/p/w500"
-            url = base + poster_path
-            ctx = ssl.create_default_context()
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
-            data = urllib.request.urlopen(url, context=ctx, timeout=8).read()
-            with open(fname, "wb") as f:
-                f.write(data)
-            callback(fname)
+            callback(fetch_tmdb_image_for(poster_path, "poster", timeout=8, upgrade=callback))
         except Exception as e:
             print(f"[TMDB] Poster download error: {e}")
             callback(None)
-    thread = threading.Thread(target=download_thread, daemon=True)
-    thread.start()
+    download_pool.submit(download_thread, priority=priority, slot=slot, token=token)
 
 def load_pixmap_safe(path):
     if path and os.path.exists(path):
@@ -653,35 +2876,68 @@ def load_pixmap_safe(path):
             return None
     return None
 
-def clear_all_posters():
+
+class PixmapCache(object):
+    """Mali LRU dekodiranih pixmapa jednog ekrana, ograničen procenjenom memorijom.
+
+    Povratak na prethodni naslov ili sliku u galeriji ne dekodira fajl
+    ponovo. Ključ je putanja + inode (ne mtime - keš ga menja pri svakom
+    pogotku); fajl zamenjen preko os.replace dobija novi inode.
+    """
+
+    def __init__(self, max_bytes=24 * 1024 * 1024, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries  # galerija: prsten trenutne slike i suseda
+        self._entries = OrderedDict()  # (path, inode, veličina) -> (pixmap, bajtova)
+        self._total = 0
+
+    def load(self, path):
+        try:
+            st = os.stat(path)
+        except (OSError, TypeError):
+            return None
+        key = (path, st.st_ino, st.st_size)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry[0]
+        pixmap = load_pixmap_safe(path)
+        if pixmap is None:
+            return None
+        size = image_size(path)
+        cost = size[0] * size[1] * 4 if size else 1024 * 1024  # ARGB u memoriji
+        self._entries[key] = (pixmap, cost)
+        self._total += cost
+        while len(self._entries) > 1 and (self._total > self.max_bytes or
+                                          (self.max_entries and len(self._entries) > self.max_entries)):
+            _, (_, old_cost) = self._entries.popitem(last=False)
+            self._total -= old_cost
+        return pixmap
+
+    def retain(self, paths):
+        """Izbacuje sve pixmape čija putanja nije u `paths` (prozor galerije)"""
+        for key in [key for key in self._entries if key[0] not in paths]:
+            _, cost = self._entries.pop(key)
+            self._total -= cost
+
+    def clear(self):
+        self._entries.clear()
+        self._total = 0
+
+def clear_all_posters(kind=None):
+    """Briše keširane slike (sve ili jednu vrstu); vraća (broj, MB)"""
     try:
-        folder = ensure_cache_folder()
-        deleted_count = 0
-        total_size = 0
-        for filename in os.listdir(folder):
-            if filename.startswith(('movie_', 'tv_', 'gallery_backdrop_', 'gallery_poster_')) and (filename.endswith('.jpg') or filename.endswith('.png')):
-                filepath = os.path.join(folder, filename)
-                if os.path.isfile(filepath):
-                    file_size = os.path.getsize(filepath)
-                    os.remove(filepath)
-                    deleted_count += 1
-                    total_size += file_size
+        deleted_count, total_size = image_cache.clear(kind)
         return deleted_count, total_size / (1024.0 * 1024.0)
-    except Exception:
+    except Exception as e:
+        print(f"[TMDB] Clear cache error: {e}")
         return 0, 0.0
 
-def get_cache_info():
+def get_cache_info(kind=None):
+    """Broj i veličina (MB) keširanih slika, iz manifesta - bez skeniranja foldera"""
     try:
-        folder = ensure_cache_folder()
-        poster_count = 0
-        total_size = 0
-        for filename in os.listdir(folder):
-            if filename.startswith(('movie_', 'tv_', 'gallery_backdrop_', 'gallery_poster_')) and (filename.endswith('.jpg') or filename.endswith('.png')):
-                filepath = os.path.join(folder, filename)
-                if os.path.isfile(filepath):
-                    poster_count += 1
-                    total_size += os.path.getsize(filepath)
-        return poster_count, total_size / (1024.0 * 1024.0)
+        count, total_size = image_cache.stats(kind)
+        return count, total_size / (1024.0 * 1024.0)
     except Exception:
         return 0, 0.0
 
@@ -707,6 +2963,16 @@ def get_cache_info():
     cleaned_title = re.sub(r'\s+', ' ', cleaned_title).strip()
     
     return cleaned_title
+
+def cache_clear_choices():
+    """Stavke za ChoiceBox brisanja keša: (tekst, vrsta); "all" briše sve"""
+    count, size = get_cache_info()
+    choices = [(f"All images - {count} ({size:.1f} MB)", "all")]
+    for kind in IMAGE_KINDS:
+        kind_count, kind_size = get_cache_info(kind)
+        if kind_count:
+            choices.append((f"{IMAGE_KIND_LABELS[kind]} - {kind_count} ({kind_size:.1f} MB)", kind))
+    return choices
  
 # ---------- MAIN SEARCH SCREEN ----------
 class CiefpTMDBMain(Screen):
@@ -805,6 +3071,22 @@ class CiefpTMDBMain(Screen):
         self.download_timer = eTimer()
         self.download_timer.timeout.get().append(self._download_timeout)
         self.download_in_progress = False
+        # Dekodirane slike za brz povratak na prethodni naslov
+        self.pixmap_cache = PixmapCache()
+        # Token trenutne generacije zahteva (zap/nova pretraga ga otkazuje)
+        self.request_token = CancelToken()
+        # Spekulativni prefetch kanala u smeru zapovanja; promena smera ga otkazuje
+        self.zap_direction = 0
+        self.zap_slots = {}  # slot predviđanja -> njegov CancelToken (u redu ili u toku)
+        # Debounce: kanal se menja odmah, a pretraga tek kada korisnik stane
+        self.zap_timer = eTimer()
+        self.zap_timer.timeout.get().append(self._zap_settled)
+        # Pozadinski posao (pretraga/učitavanje) i indikator napretka
+        self.job_running = False
+        self.job_label = ""
+        self.progress_frame = 0
+        self.progress_timer = eTimer()
+        self.progress_timer.timeout.get().append(self._progress_tick)
 
         # current media info
         self.media_id = None
@@ -826,23 +3108,149 @@ class CiefpTMDBMain(Screen):
         self.onLayoutFinish.append(self.auto_epg_search)
         self.onLayoutFinish.append(self.display_service_name)
     
+    def new_request_generation(self):
+        """Otkazuje download-e i lookup-e prethodne generacije i vraća novi token"""
+        self.request_token.cancel()
+        self.request_token = CancelToken()
+        self._stop_progress()
+        return self.request_token
+
+    def run_job(self, label, fetch, on_done, *args):
+        """Izvršava blokirajući `fetch(*args)` u pozadini, a `on_done(result)` u main loop-u.
+
+        Dok posao traje status prikazuje napredak; EXIT ga otkazuje.
+        """
+        token = self.new_request_generation()
+
+        def work():
+            try:
+                result = fetch(*args)
+            except RequestCancelled:
+                return
+            except Exception as e:
+                print(f"[TMDB] Job error ({label}): {e}")
+                run_on_main(token.guard(self._job_failed), e, key=(id(self), "job"))
+                return
+            run_on_main(token.guard(self._job_finished), on_done, result, key=(id(self), "job"))
+
+        self.job_label = label
+        self.job_running = True
+        self.progress_frame = 0
+        self._progress_tick()
+        self.progress_timer.start(250, False)
+        download_pool.submit(work, slot="job", token=token)
+        return token
+
+    def _job_finished(self, on_done, result):
+        self._stop_progress()
+        on_done(result)
+        self.show_offline_state()
+
+    def _job_failed(self, error):
+        self._stop_progress()
+        self["status"].setText(f"Error: {str(error)[:60]}")
+        self.show_offline_state()
+
+    def show_offline_state(self):
+        """Označava status kada je TMDB nedostupan - rezultati su tada samo iz keša"""
+        if http_client.is_available(TMDB_API_HOST):
+            return
+        text = self["status"].getText()
+        if "[Offline]" not in text:
+            self["status"].setText(f"{text} [Offline]".strip())
+
+    def _progress_tick(self):
+        spinner = "◐◓◑◒"[self.progress_frame % 4]
+        self.progress_frame += 1
+        self["status"].setText(f"{spinner} {self.job_label}")
+
+    def _stop_progress(self):
+        self.job_running = False
+        self.progress_timer.stop()
+
+    def cancel_job(self):
+        """Prekida posao u toku; vraća False ako ništa nije radilo"""
+        if not self.job_running:
+            return False
+        self.new_request_generation()
+        self["status"].setText("Cancelled")
+        return True
+
+    def load_media(self, media_id, media_type, title="", epg_title=""):
+        """Učitava detalje filma/serije u pozadini i prikazuje ih"""
+        api_key = config.plugins.ciefptmdb.tmdb_api_key.value.strip()
+        if not api_key:
+            self["status"].setText("TMDB API key not set!")
+            return
+
+        def done(details):
+            if details:
+                self.display_media_info(details, media_type, epg_title)
+            else:
+                self["status"].setText("Error loading media details")
+
+        self.run_job(f"Loading {title}..." if title else "Loading...", _get_media_details, done, media_id, media_type, api_key)
+
     def zapUp(self):
-        from Screens.InfoBar import InfoBar
-        if InfoBar and InfoBar.instance:
-            InfoBar.zapUp(InfoBar.instance)
-            self._show_placeholder()
-            self.clear_all_and_reset()
-            self.display_service_name()
-            self.auto_epg_search()
+        self.zap(-1)
 
     def zapDown(self):
+        self.zap(1)
+
+    def zap(self, direction):
+        """Menja kanal odmah; pretraga i prefetch čekaju da zapovanje stane"""
         from Screens.InfoBar import InfoBar
-        if InfoBar and InfoBar.instance:
+        if not (InfoBar and InfoBar.instance):
+            return
+        if direction < 0:
+            InfoBar.zapUp(InfoBar.instance)
+        else:
             InfoBar.zapDown(InfoBar.instance)
-            self._show_placeholder()
+        if direction != self.zap_direction:
+            # Promena smera - spekulacija za drugu stranu više nije korisna
+            self.cancel_zap_predictions()
+            self.zap_direction = direction
+        if self.zap_timer.isActive():
+            # Usred niza zapova prikaz je već očišćen - samo napusti započeto
+            self.new_request_generation()
+        else:
             self.clear_all_and_reset()
-            self.display_service_name()
-            self.auto_epg_search()
+        self.display_service_name()
+        self.zap_timer.start(ZAP_SETTLE_MS, True)
+
+    def _zap_settled(self):
+        self.auto_epg_search()
+        self.prefetch_zap_direction()
+
+    def cancel_zap_predictions(self):
+        for token in self.zap_slots.values():
+            token.cancel()
+        self.zap_slots = {}
+
+    def prefetch_zap_direction(self):
+        """Unapred razrešava trenutne emisije narednih kanala u smeru zapovanja"""
+        direction = self.zap_direction
+        api_key = config.plugins.ciefptmdb.tmdb_api_key.value.strip()
+        if not api_key:
+            return
+        todo = []
+        for event in get_now_next_events(get_neighbour_services(direction, ZAP_PREFETCH_AHEAD), with_next=False):
+            key = parse_epg_title(event['name'], event['short'] + " " + event['ext'])
+            if key[0] and key not in prefetched_titles and key not in todo:
+                todo.append(key)
+        slots = {}
+        for title, year in todo:
+            slot = ("zap", title, year)
+            token = self.zap_slots.pop(slot, None)
+            if token is None:
+                token = CancelToken()
+                download_pool.submit(prefetch_media, title, year, api_key, priority=PRIORITY_PREFETCH,
+                                     slot=slot, token=token)
+            # inače je već u redu ili se skida - ne vraćaj ga na kraj reda
+            slots[slot] = token
+        # Kanali koji su već preskočeni: izlaze iz reda, a započeti prenos se prekida
+        self.cancel_zap_predictions()
+        self.zap_slots = slots
 
     def display_service_name(self):
         service_name = self.session.nav.getCurrentService().info().getName()
@@ -902,24 +3310,37 @@ class CiefpTMDBMain(Screen):
                                       list=menu_list)
 
     def clear_cache_dialog(self):
-        """Dijalog za brisanje keša"""
+        """Dijalog za brisanje keša - sve ili samo jedna vrsta slika"""
+        if not image_cache.load_index():
+            self["status"].setText("Cache index is loading, try again in a moment")
+            return
         poster_count, cache_size = get_cache_info()
         if poster_count == 0:
             self["status"].setText("Cache is already empty!")
             return
-            
-        message = f"Delete {poster_count} posters ({cache_size:.1f} MB)?\n\nThis cannot be undone!"
-        def confirmation_callback(result):
-            if result:
-                deleted_count, freed_size = clear_all_posters()
-                if deleted_count > 0:
-                    self["status"].setText(f"Deleted {poster_count} posters ({freed_size:.1f} MB)")
-                else:
-                    self["status"].setText("No posters found to delete")
-            else:
+
+        def kind_selected(choice):
+            if not choice:
                 self["status"].setText("Cache deletion cancelled")
-                
-        self.session.openWithCallback(confirmation_callback, MessageBox, message, MessageBox.TYPE_YESNO)
+                return
+            kind = None if choice[1] == "all" else choice[1]
+            message = f"Delete {choice[0]}?\n\nThis cannot be undone!"
+
+            def confirmation_callback(result):
+                if result:
+                    deleted_count, freed_size = clear_all_posters(kind)
+                    if deleted_count > 0:
+                        self["status"].setText(f"Deleted {deleted_count} images ({freed_size:.1f} MB)")
+                    else:
+                        self["status"].setText("No images found to delete")
+                else:
+                    self["status"].setText("Cache deletion cancelled")
+
+            self.session.openWithCallback(confirmation_callback, MessageBox, message, MessageBox.TYPE_YESNO)
+
+        self.session.openWithCallback(kind_selected, ChoiceBox,
+                                      title="Clear Cache",
+                                      list=cache_clear_choices())
 
     def open_backdrop_gallery(self):
         """Otvara galeriju sa svim backdrop slikama"""
@@ -932,15 +3353,20 @@ class CiefpTMDBMain(Screen):
             self["status"].setText("TMDB API key not set!")
             return
         
+        # Slike su već stigle uz detalje (append_to_response=images)
+        images = self.current_media_details.get("images") or {}
+        if images.get("backdrops"):
+            self._open_backdrop_gallery(sort_images(images["backdrops"]))
+            return
+
+        media_id = self.current_media_details.get("id")
+        self.run_job("Loading backdrops...", get_all_backdrops, self._open_backdrop_gallery, media_id, self.current_media_type, api_key)
+
+    def _open_backdrop_gallery(self, backdrops):
         media_id = self.current_media_details.get("id")
         media_type = self.current_media_type
         media_title = self.current_media_details.get("title") or self.current_media_details.get("name", "Media")
-        
-        self["status"].setText("Loading backdrops...")
-        
-        # Uzmi sve backdrope
-        backdrops = get_all_backdrops(media_id, media_type, api_key)
-        
+
         if not backdrops:
             self["status"].setText("No backdrops found!")
             return
@@ -976,15 +3402,15 @@ class CiefpTMDBMain(Screen):
             self["status"].setText("TMDB API key not set!")
             return
         
+        # Posteri uz detalje su filtrirani po jeziku - galerija prikazuje sve
+        media_id = self.current_media_details.get("id")
+        self.run_job("Loading posters...", get_all_posters, self._open_poster_gallery, media_id, self.current_media_type, api_key)
+
+    def _open_poster_gallery(self, posters):
         media_id = self.current_media_details.get("id")
         media_type = self.current_media_type
         media_title = self.current_media_details.get("title") or self.current_media_details.get("name", "Media")
-        
-        self["status"].setText("Loading posters...")
-        
-        # Uzmi sve postere
-        posters = get_all_posters(media_id, media_type, api_key)
-        
+
         if not posters:
             self["status"].setText("No posters found!")
             return
@@ -1025,9 +3451,10 @@ class CiefpTMDBMain(Screen):
             self["status"].setText("No TV series ID!")
             return
             
-        self["status"].setText("Loading seasons...")
-        seasons = get_tv_seasons(tv_id, api_key)
-        
+        self.run_job("Loading seasons...", get_tv_seasons, self._show_season_choice, tv_id, api_key)
+
+    def _show_season_choice(self, seasons):
+        tv_id = self.current_media_details.get("id")
         if not seasons:
             self["status"].setText("No seasons found!")
             return
@@ -1068,9 +3495,11 @@ class CiefpTMDBMain(Screen):
             self["status"].setText("TMDB API key not set!")
             return
             
-        self["status"].setText(f"Loading {season_name}...")
-        episodes = get_season_episodes(tv_id, season_num, api_key)
-        
+        self.run_job(f"Loading {season_name}...", get_season_episodes,
+                     lambda episodes: self._show_episode_choice(tv_id, season_num, season_name, episodes),
+                     tv_id, season_num, api_key)
+
+    def _show_episode_choice(self, tv_id, season_num, season_name, episodes):
         if not episodes:
             self["status"].setText(f"No episodes found for {season_name}!")
             return
@@ -1128,6 +3557,7 @@ class CiefpTMDBMain(Screen):
             return
             
         self["status"].setText("Loading episode details...")
+        token = self.new_request_generation()
         
         # Koristimo podatke koje već imamo ili dobijamo dodatne detalje
         episode_name = episode_data.get("name", f"Episode {episode_num}")
@@ -1198,7 +3628,7 @@ class CiefpTMDBMain(Screen):
         still_path = episode_data.get("still_path")
         if still_path:
             # Koristimo postojeću funkciju za download, ali sa drugim prefiksom
-            download_poster_async(still_path, f"{tv_id}_s{season_num}e{episode_num}", "tv", self.episode_still_downloaded)
+            download_poster_async(still_path, f"{tv_id}_s{season_num}e{episode_num}", "tv", self.episode_still_downloaded, slot="poster", token=token)
         else:
             self._show_placeholder()
             
@@ -1207,7 +3637,7 @@ class CiefpTMDBMain(Screen):
     def episode_still_downloaded(self, path):
         """Callback kada se still slika epizode download-uje"""
         if path and os.path.exists(path):
-            pixmap = load_pixmap_safe(path)
+            pixmap = self.pixmap_cache.load(path)
             if pixmap:
                 self["poster"].instance.setPixmap(pixmap)
                 self["poster"].show()
@@ -1274,7 +3704,7 @@ class CiefpTMDBMain(Screen):
 
 
     def _show_placeholder(self):
-        px = load_pixmap_safe(PLACEHOLDER)
+        px = self.pixmap_cache.load(PLACEHOLDER)
         if px and self["poster"] and hasattr(self["poster"], "instance") and self["poster"].instance:
             try:
                 self["poster"].instance.setPixmap(px)
@@ -1284,7 +3714,10 @@ class CiefpTMDBMain(Screen):
     def show_default_background(self):
         self["backdrop"].hide()
 
-    def download_backdrop_async(self, backdrop_path, media_id, media_type, callback):
+    def download_backdrop_async(self, backdrop_path, media_id, media_type, callback, token=None):
+        if token is not None:
+            callback = token.guard(callback)
+        callback = main_thread_callback(callback, key=("download", "backdrop"))
         if not backdrop_path or not media_id:
             callback(None)
             return
@@ -1292,30 +3725,21 @@ class CiefpTMDBMain(Screen):
             callback(None)
             return
 
-        def download_thread():
-            try:
-                filename = ("backdrop_movie_" if media_type == "movie" else "backdrop_tv_") + f"{media_id}_{os.path.basename(backdrop_path)}"
-                folder = ensure_cache_folder()
-                fname = os.path.join(folder, filename)
+        shown = []
 
-                if os.path.exists(fname):
-                    callback(fname)
-                    return
+        def preview(path):
+            shown.append(path)
+            callback(path)
 
-                url = "https://image.tmdb.org/t/p/w1280" + backdrop_path
-                ctx = ssl.create_default_context()
-                ctx.check_hostname = False
-                ctx.verify_mode = ssl.CERT_NONE
-                data = urllib.request.urlopen(url, context=ctx, timeout=12).read()
-                with open(fname, "wb") as f:
-                    f.write(data)
-                callback(fname)
+        def download_thread():
+            try:
+                callback(fetch_tmdb_image_for(backdrop_path, "backdrop", timeout=12, upgrade=callback, preview=preview))
             except Exception as e:
                 print(f"[TMDB] Backdrop download error: {e}")
-                callback(None)
+                if not shown:  # pregled ostaje na ekranu ako puna slika ne stigne
+                    callback(None)
 
-        thread = threading.Thread(target=download_thread, daemon=True)
-        thread.start()
+        download_pool.submit(download_thread, priority=PRIORITY_BACKDROP, slot="backdrop", token=token)
 
     def backdrop_downloaded(self, path):
         if path and os.path.exists(path):
@@ -1331,13 +3755,15 @@ class CiefpTMDBMain(Screen):
         """Dobija IMDB ocenu u pozadini i ažurira prikaz"""
         try:
             imdb_rating = get_imdb_rating(media_info, media_type, config.plugins.ciefptmdb.omdb_api_key.value)
-            if imdb_rating:
-                self["imdb_rating"].setText(f"IMDB: {imdb_rating}/10 ⭐")
-            else:
-                self["imdb_rating"].setText("IMDB: N/A")
+            text = f"IMDB: {imdb_rating}/10 ⭐" if imdb_rating else "IMDB: N/A"
         except Exception as e:
             print(f"[TMDB] IMDB rating error: {e}")
-            self["imdb_rating"].setText("IMDB: Error")
+            text = "IMDB: Error"
+        set_text = self["imdb_rating"].setText
+        token = current_token()
+        if token is not None:
+            set_text = token.guard(set_text)
+        run_on_main(set_text, text, key=(id(self), "imdb_rating"))
 
     def display_media_info(self, details, media_type, epg_title=""):
         if not details:
@@ -1346,6 +3772,7 @@ class CiefpTMDBMain(Screen):
 
         self.current_media_details = details
         self.current_media_type = media_type
+        token = self.new_request_generation()
 
         self["status"].setText("Info loaded")
 
@@ -1362,7 +3789,7 @@ class CiefpTMDBMain(Screen):
         # IMDB RATING (dodajemo asinhrono da ne blokiramo prikaz)
         if config.plugins.ciefptmdb.show_imdb_rating.value and config.plugins.ciefptmdb.omdb_api_key.value:
             self["imdb_rating"].setText("IMDB: Loading...")
-            threading.Thread(target=self._fetch_imdb_rating, args=(details, media_type), daemon=True).start()
+            download_pool.submit(self._fetch_imdb_rating, details, media_type, slot="imdb", token=token)
         else:
             self["imdb_rating"].setText("")
 
@@ -1404,19 +3831,20 @@ class CiefpTMDBMain(Screen):
         poster_path = details.get("poster_path")
         media_id = details.get("id")
         if poster_path and media_id:
-            download_poster_async(poster_path, media_id, media_type, self.poster_downloaded)
+            download_poster_async(poster_path, media_id, media_type, self.poster_downloaded, slot="poster", token=token)
         else:
             self._show_placeholder()
 
         # BACKDROP
         backdrop_path = details.get("backdrop_path")
         if backdrop_path and media_id:
-            self.download_backdrop_async(backdrop_path, media_id, media_type, self.backdrop_downloaded)
+            self.download_backdrop_async(backdrop_path, media_id, media_type, self.backdrop_downloaded, token)
         else:
             self.current_backdrop_path = None
             self["backdrop"].hide()
 
     def auto_epg_search(self):
+        self.new_request_generation()
         self["status"].setText("Auto EPG Search in progress...")
         self.from_auto_epg = True
         self.display_mode = 0
@@ -1428,108 +3856,47 @@ class CiefpTMDBMain(Screen):
             return
 
         raw_title = event_data['name']
-        description = event_data['short'] + " " + event_data['ext']
-        title = re.sub(r"\s*\[.*?\]|\s*\(.*?\)|\s*-\s*.+$", "", raw_title).strip()
-        title = re.sub(r"^Film[:\-]?\s*|^Movie[:\-]?\s*", "", title, flags=re.I).strip()
-
-        # Izvlačenje godine iz naslova ili opisa
-        year = None
-        year_match = re.search(r"\b(19|20)\d{2}\b", raw_title + " " + description)
-        if year_match:
-            year = int(year_match.group(0))
+        title, year = parse_epg_title(raw_title, event_data['short'] + " " + event_data['ext'])
 
         if not title:
             self["status"].setText("No title found in EPG!")
             return
 
-        self["status"].setText(f"Searching: {title}" + (f" ({year})" if year else ""))
-
         api_key = config.plugins.ciefptmdb.tmdb_api_key.value.strip()
         if not api_key:
             self["status"].setText("TMDB API Key not set!")
             return
 
-        result, media_type = self.multi_search_with_fallback(title, year, api_key)
-
-        if not result:
-            self["status"].setText("Nothing found on TMDB")
-            return
-
-        media_id = result["id"]
-        details = _get_media_details(media_id, media_type, api_key)
-        if not details:
-            self["status"].setText("Error loading details")
-            return
+        def fetch():
+            result, media_type = search_media_with_fallback(title, year, api_key)
+            if not result:
+                return None, None, False
+            return _get_media_details(result["id"], media_type, api_key), media_type, True
+
+        def done(res):
+            details, media_type, found = res
+            if not found:
+                self["status"].setText("Nothing found on TMDB")
+            elif not details:
+                self["status"].setText("Error loading details")
+            else:
+                self.display_media_info(details, media_type, raw_title)
 
-        self.display_media_info(details, media_type, raw_title)
+        self.run_job(f"Searching: {title}" + (f" ({year})" if year else ""), fetch, done)
 
     def poster_downloaded(self, path):
         if path and os.path.exists(path):
-            pixmap = load_pixmap_safe(path)
+            pixmap = self.pixmap_cache.load(path)
             if pixmap:
                 self["poster"].instance.setPixmap(pixmap)
                 self["poster"].show()
                 return
 
-        placeholder = load_pixmap_safe(PLACEHOLDER)
+        placeholder = self.pixmap_cache.load(PLACEHOLDER)
         if placeholder:
             self["poster"].instance.setPixmap(placeholder)
         self["poster"].show()
 
-    def multi_search_with_fallback(self, title, year, api_key):
-        """Najbolji mogući search – koristi /search/multi + pametan fallback"""
-        try:
-            language = config.plugins.ciefptmdb.language.value
-            params = {
-                "api_key": api_key,
-                "query": title,
-                "language": language,
-                "include_adult": "false"
-            }
-            if year:
-                params["year"] = year
-
-            url = "https://api.themoviedb.org/3/search/multi?" + urllib.parse.urlencode(params)
-            ctx = ssl.create_default_context()
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
-            with urllib.request.urlopen(url, context=ctx, timeout=12) as resp:
-                data = json.loads(resp.read().decode("utf-8", errors="ignore"))
-
-            results = data.get("results", [])
-            if not results:
-                return None, None
-
-            candidates = [r for r in results if r.get("media_type") in ("movie", "tv")]
-            if not candidates:
-                return None, None
-
-            if year:
-                for c in candidates:
-                    c_year = (c.get("release_date") or c.get("first_air_date") or "")[:4]
-                    if c_year == str(year):
-                        return c, c["media_type"]
-
-            candidates.sort(key=lambda x: x.get("popularity", 0), reverse=True)
-            best = candidates[0]
-
-            if best["media_type"] == "movie":
-                temp_details = _get_media_details(best["id"], "movie", api_key)
-                runtime = temp_details.get("runtime") if temp_details else 0
-                if runtime and runtime < 35:
-                    tv_result = _search_tmdb_tv(title, year, api_key)
-                    if tv_result[0]:
-                        return tv_result
-
-            return best, best["media_type"]
-
-        except Exception as e:
-            print(f"[TMDB] Multi search error: {e}")
-            result, mtype = _search_tmdb_movie(title, year, api_key)
-            if result:
-                return result, mtype
-            return _search_tmdb_tv(title, year, api_key)
-
     def advanced_search_menu(self):
         """Prikazuje meni za naprednu pretragu"""
         from Screens.ChoiceBox import ChoiceBox
@@ -1633,9 +4000,9 @@ class CiefpTMDBMain(Screen):
             self["status"].setText("TMDB API key not set!")
             return
 
-        self["status"].setText("Loading popular movies...")
-        movies = get_popular_movies(api_key)
+        self.run_job("Loading popular movies...", get_popular_movies, self._show_popular_movies, api_key)
 
+    def _show_popular_movies(self, movies):
         if not movies:
             self["status"].setText("No popular movies found")
             return
@@ -1669,10 +4036,7 @@ class CiefpTMDBMain(Screen):
                 selected = choice[1]
                 media_id = selected.get("id")
                 title = selected.get("title", "Unknown")
-                self["status"].setText(f"Loading {title}...")
-                details = _get_media_details(media_id, "movie", api_key)
-                if details:
-                    self.display_media_info(details, "movie")
+                self.load_media(media_id, "movie", title)
 
         self.session.openWithCallback(selected_callback, ChoiceBox,
                                       title="Popular Movies (TMDB)",
@@ -1685,9 +4049,9 @@ class CiefpTMDBMain(Screen):
             self["status"].setText("TMDB API key not set!")
             return
 
-        self["status"].setText("Loading popular series...")
-        series = get_popular_tv(api_key)
+        self.run_job("Loading popular series...", get_popular_tv, self._show_popular_series, api_key)
 
+    def _show_popular_series(self, series):
         if not series:
             self["status"].setText("No popular series found")
             return
@@ -1721,10 +4085,7 @@ class CiefpTMDBMain(Screen):
                 selected = choice[1]
                 media_id = selected.get("id")
                 title = selected.get("name", "Unknown")
-                self["status"].setText(f"Loading {title}...")
-                details = _get_media_details(media_id, "tv", api_key)
-                if details:
-                    self.display_media_info(details, "tv")
+                self.load_media(media_id, "tv", title)
 
         self.session.openWithCallback(selected_callback, ChoiceBox,
                                       title="Popular Series (TMDB)",
@@ -1737,9 +4098,9 @@ class CiefpTMDBMain(Screen):
             self["status"].setText("TMDB API key not set!")
             return
 
-        self["status"].setText("Loading upcoming movies...")
-        movies = get_upcoming_movies(api_key)
+        self.run_job("Loading upcoming movies...", get_upcoming_movies, self._show_upcoming_movies, api_key)
 
+    def _show_upcoming_movies(self, movies):
         if not movies:
             self["status"].setText("No upcoming movies found")
             return
@@ -1783,10 +4144,7 @@ class CiefpTMDBMain(Screen):
                 selected = choice[1]
                 media_id = selected.get("id")
                 title = selected.get("title", "Unknown")
-                self["status"].setText(f"Loading {title}...")
-                details = _get_media_details(media_id, "movie", api_key)
-                if details:
-                    self.display_media_info(details, "movie")
+                self.load_media(media_id, "movie", title)
 
         self.session.openWithCallback(selected_callback, ChoiceBox,
                                       title="Upcoming Movies (TMDB)",
@@ -1799,9 +4157,10 @@ class CiefpTMDBMain(Screen):
             self["status"].setText("TMDB API key not set!")
             return
 
-        self["status"].setText("Loading popular persons...")
-        persons = get_popular_persons(api_key)
+        self.run_job("Loading popular persons...", get_popular_persons, self._show_popular_persons, api_key)
 
+    def _show_popular_persons(self, persons):
+        api_key = config.plugins.ciefptmdb.tmdb_api_key.value.strip()
         if not persons:
             self["status"].setText("No popular persons found")
             return
@@ -1848,13 +4207,8 @@ class CiefpTMDBMain(Screen):
         def selected_callback(choice):
             if choice:
                 selected = choice[1]
-                person_id = selected.get("id")
-                person_name = selected.get("name", "Unknown")
                 person_type = selected.get("known_for_department", "Acting")
-                self["status"].setText(f"Loading {person_name}...")
-                details = _get_person_details(person_id, api_key)
-                if details:
-                    self.display_person_info(details, api_key, person_type)
+                self.display_person_info(selected, api_key, person_type)
 
         self.session.openWithCallback(selected_callback, ChoiceBox,
                                       title="Popular Persons (TMDB)",
@@ -1867,9 +4221,10 @@ class CiefpTMDBMain(Screen):
             self["status"].setText("TMDB API key not set!")
             return
 
-        self["status"].setText("Loading trending...")
-        results = get_trending_all(api_key, "day")
+        self.run_job("Loading trending...", get_trending_all, self._show_trending_all, api_key, "day")
 
+    def _show_trending_all(self, results):
+        api_key = config.plugins.ciefptmdb.tmdb_api_key.value.strip()
         if not results:
             self["status"].setText("No trending results")
             return
@@ -1921,20 +4276,12 @@ class CiefpTMDBMain(Screen):
             if choice:
                 selected, m_type = choice[1], choice[2]
                 if m_type == "person":
-                    person_id = selected.get("id")
-                    person_name = selected.get("name", "Unknown")
                     person_type = selected.get("known_for_department", "Acting")
-                    self["status"].setText(f"Loading {person_name}...")
-                    details = _get_person_details(person_id, api_key)
-                    if details:
-                        self.display_person_info(details, api_key, person_type)
+                    self.display_person_info(selected, api_key, person_type)
                 else:
                     media_id = selected.get("id")
                     title = selected.get("title") or selected.get("name", "Unknown")
-                    self["status"].setText(f"Loading {title}...")
-                    details = _get_media_details(media_id, m_type, api_key)
-                    if details:
-                        self.display_media_info(details, m_type)
+                    self.load_media(media_id, m_type, title)
 
         self.session.openWithCallback(selected_callback, ChoiceBox,
                                       title="Trending All - Daily (TMDB)",
@@ -1947,9 +4294,9 @@ class CiefpTMDBMain(Screen):
             self["status"].setText("TMDB API key not set!")
             return
 
-        self["status"].setText("Loading top rated movies...")
-        movies = get_top_rated_movies(api_key)
+        self.run_job("Loading top rated movies...", get_top_rated_movies, self._show_top_rated_movies, api_key)
 
+    def _show_top_rated_movies(self, movies):
         if not movies:
             self["status"].setText("No top rated movies found")
             return
@@ -1979,10 +4326,7 @@ class CiefpTMDBMain(Screen):
                 selected = choice[1]
                 media_id = selected.get("id")
                 title = selected.get("title", "Unknown")
-                self["status"].setText(f"Loading {title}...")
-                details = _get_media_details(media_id, "movie", api_key)
-                if details:
-                    self.display_media_info(details, "movie")
+                self.load_media(media_id, "movie", title)
 
         self.session.openWithCallback(selected_callback, ChoiceBox,
                                       title="Top Rated Movies (TMDB)",
@@ -1995,9 +4339,9 @@ class CiefpTMDBMain(Screen):
             self["status"].setText("TMDB API key not set!")
             return
 
-        self["status"].setText("Loading top rated series...")
-        series = get_top_rated_tv(api_key)
+        self.run_job("Loading top rated series...", get_top_rated_tv, self._show_top_rated_series, api_key)
 
+    def _show_top_rated_series(self, series):
         if not series:
             self["status"].setText("No top rated series found")
             return
@@ -2027,10 +4371,7 @@ class CiefpTMDBMain(Screen):
                 selected = choice[1]
                 media_id = selected.get("id")
                 title = selected.get("name", "Unknown")
-                self["status"].setText(f"Loading {title}...")
-                details = _get_media_details(media_id, "tv", api_key)
-                if details:
-                    self.display_media_info(details, "tv")
+                self.load_media(media_id, "tv", title)
 
         self.session.openWithCallback(selected_callback, ChoiceBox,
                                       title="Top Rated Series (TMDB)",
@@ -2047,25 +4388,40 @@ class CiefpTMDBMain(Screen):
         self.show_classic_view()
         self.clear_display()
 
-        self["status"].setText(f"Searching {person_type}...")
-        match, media_type = _search_tmdb_person(query, api_key)
-
-        if not match:
-            self["status"].setText(f"No {person_type} found")
-            self._show_placeholder()
-            return
+        def fetch():
+            match, media_type = _search_tmdb_person(query, api_key)
+            if not match:
+                return None, None
+            return match, _get_person_details(match.get("id"), api_key)
+
+        def done(res):
+            match, details = res
+            if not match:
+                self["status"].setText(f"No {person_type} found")
+                self._show_placeholder()
+            elif not details:
+                self["status"].setText("Error loading person details")
+            else:
+                self.current_person_name = query
+                self.show_person_details(details, person_type)
 
-        self.current_person_name = query
-        self.display_person_info(match, api_key, person_type)
+        self.run_job(f"Searching {person_type}...", fetch, done)
 
     def display_person_info(self, person_data, api_key, person_type):
-        """Prikazuje informacije o glumcu/direktoru sa korisnim informacijama"""
-        person_id = person_data.get("id")
-        details = _get_person_details(person_id, api_key)
+        """Učitava detalje osobe u pozadini i prikazuje ih"""
+        def done(details):
+            if details:
+                self.show_person_details(details, person_type)
+            else:
+                self["status"].setText("Error loading person details")
 
-        if not details:
-            self["status"].setText("Error loading person details")
-            return
+        name = person_data.get("name", "")
+        self.run_job(f"Loading {name}..." if name else "Loading...", _get_person_details, done, person_data.get("id"), api_key)
+
+    def show_person_details(self, details, person_type):
+        """Prikazuje informacije o glumcu/direktoru sa korisnim informacijama"""
+        person_id = details.get("id")
+        token = self.new_request_generation()
 
         self.current_person_details = details
         self.current_person_name = details.get("name", "Unknown")
@@ -2157,7 +4513,7 @@ class CiefpTMDBMain(Screen):
 
         profile_path = details.get("profile_path")
         if profile_path:
-            download_person_photo_async(profile_path, person_id, self.person_photo_downloaded)
+            download_person_photo_async(profile_path, person_id, self.person_photo_downloaded, slot="poster", token=token)
         else:
             self._show_placeholder()
 
@@ -2166,7 +4522,7 @@ class CiefpTMDBMain(Screen):
     def person_photo_downloaded(self, path):
         """Callback kada se photo download završi"""
         if path and os.path.exists(path):
-            pixmap = load_pixmap_safe(path)
+            pixmap = self.pixmap_cache.load(path)
             if pixmap:
                 self["poster"].instance.setPixmap(pixmap)
                 self["poster"].show()
@@ -2296,15 +4652,8 @@ class CiefpTMDBMain(Screen):
         self.show_classic_view()
         self.clear_display()
 
-        self["status"].setText(f"Loading {media_title}...")
-
-        details = _get_media_details(media_id, media_type, api_key)
-        if not details:
-            self["status"].setText("Error loading media details")
-            return
-
         person_name = getattr(self, 'current_person_name', 'Filmography')
-        self.display_media_info(details, media_type, f"From: {person_name}")
+        self.load_media(media_id, media_type, media_title, f"From: {person_name}")
 
     def show_main_cast(self):
         """Prikazuje glavnu glumačku ekipu"""
@@ -2425,9 +4774,14 @@ class CiefpTMDBMain(Screen):
         self["poster"].show()
 
         if self.current_backdrop_path and os.path.exists(self.current_backdrop_path):
-            pixmap = LoadPixmap(self.current_backdrop_path)
+            pixmap = self.pixmap_cache.load(self.current_backdrop_path)
             if pixmap:
                 self["backdrop"].instance.setPixmap(pixmap)
+                # Pregled (ili original bez Pillow-a) popunjava widget skaliranjem
+                try:
+                    self["backdrop"].instance.setScale(0 if fits_widget(self.current_backdrop_path, "backdrop") else 2)
+                except Exception:
+                    pass
                 self["backdrop"].show()
         else:
             self["backdrop"].hide()
@@ -2468,7 +4822,7 @@ class CiefpTMDBMain(Screen):
         if self.download_in_progress:
             self.download_in_progress = False
             self["status"].setText("Poster download timeout")
-            px = load_pixmap_safe(PLACEHOLDER)
+            px = self.pixmap_cache.load(PLACEHOLDER)
             if px:
                 try:
                     self["poster"].instance.setPixmap(px)
@@ -2485,27 +4839,32 @@ class CiefpTMDBMain(Screen):
         self.show_classic_view()
         self.clear_display()
 
-        self["status"].setText(f"Searching {mode}...")
-        if mode == "movie":
-            match, media_type = _search_tmdb_movie(query, None, api_key)
-        else:
-            match, media_type = _search_tmdb_tv(query, None, api_key)
-
-        if not match:
-            self["status"].setText("No results found")
-            self._show_placeholder()
-            return
+        def fetch():
+            if mode == "movie":
+                match, media_type = _search_tmdb_movie(query, None, api_key)
+            else:
+                match, media_type = _search_tmdb_tv(query, None, api_key)
+            if not match:
+                return None, None, None
+            return match, media_type, _get_media_details(match.get("id"), media_type, api_key)
+
+        def done(res):
+            match, media_type, details = res
+            if not match:
+                self["status"].setText("No results found")
+                self._show_placeholder()
+                return
 
-        self.media_id = match.get("id")
-        self.media_type = media_type
+            self.media_id = match.get("id")
+            self.media_type = media_type
+            if not details:
+                self["status"].setText("Error fetching details")
+                self._show_placeholder()
+                return
 
-        details = _get_media_details(self.media_id, self.media_type, api_key)
-        if not details:
-            self["status"].setText("Error fetching details")
-            self._show_placeholder()
-            return
+            self.display_media_info(details, media_type)
 
-        self.display_media_info(details, media_type)
+        self.run_job(f"Searching {mode}...", fetch, done)
 
     def _display_media_details(self, match, media_type, api_key, epg_info=None):
         details = _get_media_details(self.media_id, self.media_type, api_key)
@@ -2544,7 +4903,7 @@ class CiefpTMDBMain(Screen):
 
         if config.plugins.ciefptmdb.show_imdb_rating.value and config.plugins.ciefptmdb.omdb_api_key.value:
             self["imdb_rating"].setText("IMDB: Loading...")
-            threading.Thread(target=self._fetch_imdb_rating, args=(details, media_type), daemon=True).start()
+            download_pool.submit(self._fetch_imdb_rating, details, media_type, slot="imdb", token=self.request_token)
         else:
             self["imdb_rating"].setText("")
 
@@ -2597,10 +4956,7 @@ class CiefpTMDBMain(Screen):
             self.download_in_progress = True
             self.download_timer.start(12000, True)
 
-            folder = ensure_cache_folder()
-            fname = (f"movie_{self.media_id}_" if media_type == "movie" else f"tv_{self.media_id}_") + os.path.basename(
-                self.poster_path or "none.jpg")
-            local_cache = os.path.join(folder, fname)
+            local_cache = cached_image_for(self.poster_path, "poster")
 
             def poster_callback(local_path):
                 try:
@@ -2610,21 +4966,21 @@ class CiefpTMDBMain(Screen):
                 self.download_in_progress = False
                 if not local_path or not os.path.exists(local_path):
                     local_path = PLACEHOLDER
-                px = load_pixmap_safe(local_path)
+                px = self.pixmap_cache.load(local_path)
                 if px and self["poster"].instance:
                     self["poster"].instance.setPixmap(px)
                 self["status"].setText("Info loaded ✓" if local_path != PLACEHOLDER else "Info loaded")
 
-            if os.path.exists(local_cache):
+            if local_cache:
                 poster_callback(local_cache)
             else:
-                download_poster_async(self.poster_path, self.media_id, self.media_type, poster_callback)
+                download_poster_async(self.poster_path, self.media_id, self.media_type, poster_callback, slot="poster", token=self.request_token)
         else:
             self._show_placeholder()
 
         backdrop_path = details.get("backdrop_path")
         if backdrop_path and self.media_id:
-            self.download_backdrop_async(backdrop_path, self.media_id, media_type, self.backdrop_downloaded)
+            self.download_backdrop_async(backdrop_path, self.media_id, media_type, self.backdrop_downloaded, self.request_token)
         else:
             self["backdrop"].hide()
 
@@ -2635,6 +4991,7 @@ class CiefpTMDBMain(Screen):
 
     def clear_all_and_reset(self):
         """Resetuje prikaz na početno stanje"""
+        self.new_request_generation()
         self.clear_display()
         self._show_placeholder()
         self["status"].setText("Ready")
@@ -2661,6 +5018,9 @@ class CiefpTMDBMain(Screen):
 
     def keyBack(self):
         """Handle back/exit button - step back in navigation"""
+        if self.cancel_job():
+            return
+
         if hasattr(self, 'current_media_details') and self.current_media_details is not None:
             self.clear_all_and_reset()
             return
@@ -2685,6 +5045,15 @@ class CiefpTMDBMain(Screen):
             self.download_timer.stop()
         except:
             pass
+        self.zap_timer.stop()
+        self.request_token.cancel()
+        self.cancel_zap_predictions()
+        self.progress_timer.stop()
+        self.pixmap_cache.clear()
+        http_client.close_idle()
+        download_pool.submit(image_cache.flush_recency, priority=PRIORITY_PREFETCH)
+        if cold_cache_folder():
+            download_pool.submit(write_back_caches, priority=PRIORITY_PREFETCH)
         try:
             if "actions" in self:
                 self["actions"].destroy()
@@ -2706,6 +5075,9 @@ class CiefpTMDBMain(Screen):
 
 
 # ---------- BACKDROP GALLERY SCREEN ----------
+GALLERY_PREFETCH = 2  # suseda unapred sa svake strane
+
+
 class BackdropGalleryScreen(Screen):
     skin = """
         <screen position="center,center" size="1920,1080" title="Backdrop Gallery">
@@ -2741,6 +5113,13 @@ class BackdropGalleryScreen(Screen):
         self.images_list = images_list
         self.current_index = current_index
         self.gallery_type = gallery_type  # "backdrops" ili "posters"
+        self.request_token = CancelToken()
+        self.posters_token = None  # učitavanje postera za "Switch to Posters"
+        # Trenutna slika i ±GALLERY_PREFETCH suseda, dekodirani unapred (+1 za pregled)
+        self.pixmap_cache = PixmapCache(max_bytes=48 * 1024 * 1024, max_entries=2 * GALLERY_PREFETCH + 2)
+        self.ring = {}  # TMDB file_path -> lokalna putanja dekodirane slike u prozoru
+        self.direction = 1
+        self.prefetch_token = CancelToken()
 
         self["backdrop_image"] = Pixmap()
         self["poster_image"] = Pixmap()
@@ -2765,6 +5144,11 @@ class BackdropGalleryScreen(Screen):
         self.onClose.append(self.__onClose)
 
     def __onClose(self):
+        self.request_token.cancel()
+        self.prefetch_token.cancel()
+        if self.posters_token is not None:
+            self.posters_token.cancel()
+        self.pixmap_cache.clear()
         try:
             if "actions" in self:
                 self["actions"].destroy()
@@ -2772,6 +5156,47 @@ class BackdropGalleryScreen(Screen):
         except:
             pass
 
+    def neighbour_indexes(self):
+        """Indeksi suseda trenutne slike, prvo u smeru kretanja: +1, +2, -1, -2"""
+        total = len(self.images_list)
+        order = []
+        for step in range(1, GALLERY_PREFETCH + 1):
+            order.append((self.current_index + self.direction * step) % total)
+        for step in range(1, GALLERY_PREFETCH + 1):
+            order.append((self.current_index - self.direction * step) % total)
+        seen = set([self.current_index])
+        return [idx for idx in order if not (idx in seen or seen.add(idx))]
+
+    def trim_ring(self):
+        """Prsten zadržava samo trenutnu sliku i susede; izbacuje po udaljenosti, ne po LRU"""
+        window = set(self.images_list[idx].get("file_path", "") for idx in [self.current_index] + self.neighbour_indexes())
+        self.ring = dict((file_path, path) for file_path, path in self.ring.items() if file_path in window)
+        self.pixmap_cache.retain(set(self.ring.values()))
+
+    def warm(self, file_path, path):
+        """Dekodira sliku iz prozora u prsten (main loop)"""
+        if file_path in self.ring and self.ring[file_path] != path:
+            self.pixmap_cache.retain(set(p for f, p in self.ring.items() if f != file_path))
+        self.ring[file_path] = path
+        return self.pixmap_cache.load(path)
+
+    def prefetch_neighbours(self):
+        """Skida susede u pozadini i dekodira ih u prsten, pa je sledeći korak trenutan"""
+        target = self.image_target()
+        token = self.prefetch_token
+        for idx in self.neighbour_indexes():
+            file_path = self.images_list[idx].get("file_path", "")
+            if not file_path or file_path in self.ring:
+                continue
+
+            def prefetch(file_path=file_path):
+                path = fetch_tmdb_image_for(file_path, target, timeout=15)
+                # Dekodiranje je u main loop-u, posle slike koja je trenutno na ekranu
+                run_on_main(token.guard(self.warm), file_path, path, key=(id(self), "warm", file_path))
+
+            download_pool.submit(prefetch, priority=PRIORITY_PREFETCH,
+                                 slot=("gallery_prefetch", id(self), file_path), token=token)
+
     def load_current_image(self):
         if not self.images_list or self.current_index >= len(self.images_list):
             self["info"].setText("No images available")
@@ -2810,59 +5235,56 @@ class BackdropGalleryScreen(Screen):
             self["poster_image"].show()
 
         # Download sliku
+        self.trim_ring()
         self.download_and_display_image(file_path)
+        self.prefetch_neighbours()
 
     def download_and_display_image(self, file_path):
         """Download i prikaz slike sa različitim veličinama za postere i backdropove"""
+        # Slika prethodne stranice više ne sme da stigne na ekran
+        self.request_token.cancel()
+        token = self.request_token = CancelToken()
         try:
-            # Generiši cache ime
-            if self.gallery_type == "backdrops":
-                filename = f"gallery_backdrop_{self.media_id}_{os.path.basename(file_path)}"
-            else:
-                filename = f"gallery_poster_{self.media_id}_{os.path.basename(file_path)}"
-
-            folder = ensure_cache_folder()
-            fname = os.path.join(folder, filename)
+            # Originali su istih veličina kao na glavnom ekranu, pa galerija deli keš sa njim
+            target = self.image_target()
 
             # Proveri da li već postoji u cache-u
-            if os.path.exists(fname):
-                self.display_image(fname)
+            fname = cached_image_for(file_path, target)
+            if fname:
+                self.display_image(fname, file_path)
                 return
 
-            # Odredi veličinu za download
-            if self.gallery_type == "posters":
-                base_url = "https://image.tmdb.org/t/p/w500"  # Manja rezolucija za postere
-            else:
-                base_url = "https://image.tmdb.org/t/p/w1280"  # Puna rezolucija za backdropove
+            def show(path):
+                run_on_main(token.guard(self.display_image), path, key=(id(self), "image"))
 
-            url = base_url + file_path
+            def show_full(path):
+                run_on_main(token.guard(self.display_image), path, file_path, key=(id(self), "image"))
 
             def download_thread():
                 try:
-                    ctx = ssl.create_default_context()
-                    ctx.check_hostname = False
-                    ctx.verify_mode = ssl.CERT_NONE
-                    data = urllib.request.urlopen(url, context=ctx, timeout=15).read()
-                    with open(fname, "wb") as f:
-                        f.write(data)
+                    fname = fetch_tmdb_image_for(file_path, target, timeout=15, upgrade=show_full, preview=show)
                     # Prikaži sliku nakon download-a
-                    self.display_image(fname)
+                    show_full(fname)
+                except RequestCancelled:
+                    pass
                 except Exception as e:
                     print(f"[Gallery] Download error: {e}")
-                    self["info"].setText(f"Download error: {str(e)[:50]}")
+                    run_on_main(token.guard(self["info"].setText), f"Download error: {str(e)[:50]}", key=(id(self), "info"))
 
-            thread = threading.Thread(target=download_thread, daemon=True)
-            thread.start()
+            download_pool.submit(download_thread, slot="gallery", token=token)
 
         except Exception as e:
             print(f"[Gallery] Error: {e}")
             self["info"].setText(f"Error loading image")
 
-    def display_image(self, path):
-        """Prikazuje sliku na ekranu"""
+    def image_target(self):
+        return "gallery_backdrop" if self.gallery_type == "backdrops" else "gallery_poster"
+
+    def display_image(self, path, file_path=None):
+        """Prikazuje sliku na ekranu; sa file_path je to puna slika i ulazi u prsten"""
         if not path or not os.path.exists(path):
             # Fallback ako nema slike
-            placeholder = load_pixmap_safe(PLACEHOLDER)
+            placeholder = self.pixmap_cache.load(PLACEHOLDER)
             if placeholder:
                 if self.gallery_type == "backdrops":
                     self["backdrop_image"].instance.setPixmap(placeholder)
@@ -2870,23 +5292,24 @@ class BackdropGalleryScreen(Screen):
                     self["poster_image"].instance.setPixmap(placeholder)
             return
 
-        pixmap = load_pixmap_safe(path)
+        pixmap = self.warm(file_path, path) if file_path else self.pixmap_cache.load(path)
         if not pixmap:
             return
 
+        # Pre-skalirana varijanta ide direktno; original (bez Pillow-a) skalira widget
+        scale = 0 if fits_widget(path, self.image_target()) else 2  # 2 = SCALE_ASPECT_CROP
+
         # Postavi sliku na odgovarajući widget
         if self.gallery_type == "backdrops":
             self["backdrop_image"].instance.setPixmap(pixmap)
-            # Podesi scale za backdrop (2 = scale to fill and crop)
             try:
-                self["backdrop_image"].instance.setScale(2)  # SCALE_ASPECT_CROP
+                self["backdrop_image"].instance.setScale(scale)
             except:
                 pass
         else:
             self["poster_image"].instance.setPixmap(pixmap)
-            # Podesi scale za poster (2 = scale to fill and crop)
             try:
-                self["poster_image"].instance.setScale(2)  # SCALE_ASPECT_CROP
+                self["poster_image"].instance.setScale(scale)
             except:
                 pass
 
@@ -2896,6 +5319,7 @@ class BackdropGalleryScreen(Screen):
             return
 
         self.current_index = (self.current_index - 1) % len(self.images_list)
+        self.set_direction(-1)
         self.load_current_image()
 
     def next_image(self):
@@ -2904,8 +5328,16 @@ class BackdropGalleryScreen(Screen):
             return
 
         self.current_index = (self.current_index + 1) % len(self.images_list)
+        self.set_direction(1)
         self.load_current_image()
 
+    def set_direction(self, direction):
+        if direction != self.direction:
+            # Promena smera - susedi iz starog smera čekaju u redu nepotrebno
+            self.prefetch_token.cancel()
+            self.prefetch_token = CancelToken()
+            self.direction = direction
+
     def switch_gallery_type(self):
         """Prebacuje između backdroпova i postera"""
         if self.gallery_type == "backdrops":
@@ -2922,7 +5354,19 @@ class BackdropGalleryScreen(Screen):
             self["info"].setText("TMDB API key not set!")
             return
 
-        posters = get_all_posters(self.media_id, self.media_type, api_key)
+        if self.posters_token is not None and not self.posters_token.cancelled:
+            return  # već se učitavaju
+        token = self.posters_token = CancelToken()
+        self["info"].setText("Loading posters...")
+
+        def work():
+            posters = get_all_posters(self.media_id, self.media_type, api_key)
+            run_on_main(token.guard(self.show_posters_gallery), posters, key=(id(self), "posters"))
+
+        download_pool.submit(work, token=token)
+
+    def show_posters_gallery(self, posters):
+        self.posters_token = None
         if not posters:
             self.session.open(MessageBox, "No posters found for this media.", MessageBox.TYPE_INFO)
             return
@@ -2984,8 +5428,12 @@ class SettingsScreen(Screen):
             }, -1)
         self.onLayoutFinish.append(self.buildMenu)
         self.onClose.append(self.__onClose)
+        # Indeksi keša se učitavaju u pozadini; meni se osveži kada stignu
+        self.cache_index_token = None
 
     def __onClose(self):
+        if self.cache_index_token is not None:
+            self.cache_index_token.cancel()
         try:
             if "actions" in self:
                 self["actions"].destroy()
@@ -3027,12 +5475,60 @@ class SettingsScreen(Screen):
         current_lang = lang_names.get(config.plugins.ciefptmdb.language.value, "English")
         self.menu_list.append(f"Description language: {current_lang}")
 
-        poster_count, cache_size = get_cache_info()
-        self.menu_list.append(f"Cache: {poster_count} posters ({cache_size:.1f} MB)")
-        self.menu_list.append(">>> CLEAR ALL POSTERS (MENU button) <<<")
+        self.menu_list.append(f"Cache size limit: {config.plugins.ciefptmdb.cache_max_size.value} MB")
+
+        upgrade_status = "YES" if config.plugins.ciefptmdb.image_upgrade.value else "NO"
+        self.menu_list.append(f"Upgrade images on slow link:  {upgrade_status}")
+
+        progressive_status = "YES" if config.plugins.ciefptmdb.progressive_images.value else "NO"
+        self.menu_list.append(f"Progressive backdrops:  {progressive_status}")
+
+        cold_folder = config.plugins.ciefptmdb.cold_cache_folder.value
+        self.menu_list.append(f"Disk cache: {'Disabled' if cold_folder == 'none' else cold_folder}")
+
+        prefetch_count = config.plugins.ciefptmdb.epg_prefetch.value
+        self.menu_list.append(f"EPG prefetch: {'Off' if prefetch_count == '0' else 'next ' + prefetch_count + ' events'}")
+
+        index_workers = config.plugins.ciefptmdb.index_workers.value
+        self.menu_list.append(f"Bouquet indexer: {'Off' if index_workers == '0' else 'On'}")
+        self.menu_list.append(f"Indexer budget: {config.plugins.ciefptmdb.index_budget.value} requests per pass")
+
+        if image_cache.indexed():
+            poster_count, cache_size = get_cache_info()
+            cache_line = f"Cache: {poster_count} images ({cache_size:.1f} MB)"
+        else:
+            cache_line = "Cache: …"
+            self.load_cache_index()
+        if cold_cache_folder():
+            if cold_image_cache.indexed():
+                cold_count, cold_size = cold_image_cache.stats()
+                cache_line += f", disk: {cold_count} ({cold_size / (1024 * 1024):.1f} MB)"
+            else:
+                cache_line += ", disk: …"
+                self.load_cache_index()
+        self.menu_list.append(cache_line)
+        self.menu_list.append(">>> CLEAR CACHE (MENU button) <<<")
 
         self["menu"].setList(self.menu_list)
 
+    def load_cache_index(self):
+        """Prvo učitavanje indeksa keša (skeniranje, migracija) ne sme da blokira main loop"""
+        if self.cache_index_token is not None and not self.cache_index_token.cancelled:
+            return
+        token = self.cache_index_token = CancelToken()
+
+        def work():
+            image_cache.stats()
+            cold_image_cache.stats()
+            run_on_main(token.guard(self.cache_index_loaded), key=(id(self), "cache_index"))
+
+        download_pool.submit(work, priority=PRIORITY_PREFETCH, token=token)
+
+    def cache_index_loaded(self):
+        self.cache_index_token = None
+        if image_cache.indexed() and cold_image_cache.indexed():
+            self.buildMenu()
+
     def keyOk(self):
         idx = self["menu"].getSelectedIndex()
 
@@ -3050,9 +5546,72 @@ class SettingsScreen(Screen):
             self.buildMenu()
         elif idx == 5:
             self.change_language()
+        elif idx == 6:
+            self.change_cache_limit()
         elif idx == 7:
+            config.plugins.ciefptmdb.image_upgrade.value = not config.plugins.ciefptmdb.image_upgrade.value
+            self.buildMenu()
+        elif idx == 8:
+            config.plugins.ciefptmdb.progressive_images.value = not config.plugins.ciefptmdb.progressive_images.value
+            self.buildMenu()
+        elif idx == 9:
+            self.change_cold_folder()
+        elif idx == 10:
+            self.change_epg_prefetch()
+        elif idx == 11:
+            self.cycle_choice(config.plugins.ciefptmdb.index_workers, INDEX_WORKER_CHOICES, "Bouquet indexer")
+        elif idx == 12:
+            self.cycle_choice(config.plugins.ciefptmdb.index_budget, INDEX_BUDGET_CHOICES, "Indexer budget")
+        elif idx == 14:
             self.clearCache()
 
+    def change_cache_limit(self):
+        current = config.plugins.ciefptmdb.cache_max_size.value
+        try:
+            next_idx = (CACHE_SIZE_CHOICES.index(current) + 1) % len(CACHE_SIZE_CHOICES)
+        except ValueError:
+            next_idx = 0
+        config.plugins.ciefptmdb.cache_max_size.value = CACHE_SIZE_CHOICES[next_idx]
+        image_cache.trim()
+        self["status"].setText(f"Cache limit → {CACHE_SIZE_CHOICES[next_idx]} MB")
+        self.buildMenu()
+
+    def cycle_choice(self, element, choices, label):
+        try:
+            next_idx = (choices.index(element.value) + 1) % len(choices)
+        except ValueError:
+            next_idx = 0
+        element.value = choices[next_idx]
+        self["status"].setText(f"{label} → {element.getText()}")
+        self.buildMenu()
+
+    def change_epg_prefetch(self):
+        current = config.plugins.ciefptmdb.epg_prefetch.value
+        try:
+            next_idx = (EPG_PREFETCH_CHOICES.index(current) + 1) % len(EPG_PREFETCH_CHOICES)
+        except ValueError:
+            next_idx = 0
+        count = EPG_PREFETCH_CHOICES[next_idx]
+        config.plugins.ciefptmdb.epg_prefetch.value = count
+        self["status"].setText("EPG prefetch → " + ("Off" if count == "0" else f"next {count} events"))
+        self.buildMenu()
+
+    def change_cold_folder(self):
+        current = config.plugins.ciefptmdb.cold_cache_folder.value
+        try:
+            next_idx = (COLD_CACHE_CHOICES.index(current) + 1) % len(COLD_CACHE_CHOICES)
+        except ValueError:
+            next_idx = 0
+        folder = COLD_CACHE_CHOICES[next_idx]
+        config.plugins.ciefptmdb.cold_cache_folder.value = folder
+        if folder == "none":
+            self["status"].setText("Disk cache → Disabled")
+        elif cold_cache_folder() is None:
+            self["status"].setText(f"Disk cache → {folder} (not mounted)")
+        else:
+            self["status"].setText(f"Disk cache → {folder}")
+        self.buildMenu()
+
 
     def change_language(self):
         lang_order = [
@@ -3117,28 +5676,44 @@ class SettingsScreen(Screen):
         self.session.openWithCallback(callback, VirtualKeyBoard, title="Enter OMDb API Key", text=current_key)
 
     def clearCache(self):
+        if not image_cache.load_index():
+            self["status"].setText("Cache index is loading, try again in a moment")
+            return
         poster_count, cache_size = get_cache_info()
         if poster_count == 0:
             self["status"].setText("Cache is already empty!")
             return
-        message = f"Delete {poster_count} posters ({cache_size:.1f} MB)?\n\nThis cannot be undone!"
-        def confirmation_callback(result):
-            if result:
-                deleted_count, freed_size = clear_all_posters()
-                if deleted_count > 0:
-                    self["status"].setText(f"Deleted {poster_count} posters ({freed_size:.1f} MB)")
-                    self.buildMenu()
-                else:
-                    self["status"].setText("No posters found to delete")
-            else:
+        def kind_selected(choice):
+            if not choice:
                 self["status"].setText("Cache deletion cancelled")
-        self.session.openWithCallback(confirmation_callback, MessageBox, message, MessageBox.TYPE_YESNO)
+                return
+            kind = None if choice[1] == "all" else choice[1]
+            message = f"Delete {choice[0]}?\n\nThis cannot be undone!"
+            def confirmation_callback(result):
+                if result:
+                    deleted_count, freed_size = clear_all_posters(kind)
+                    if deleted_count > 0:
+                        self["status"].setText(f"Deleted {deleted_count} images ({freed_size:.1f} MB)")
+                        self.buildMenu()
+                    else:
+                        self["status"].setText("No images found to delete")
+                else:
+                    self["status"].setText("Cache deletion cancelled")
+            self.session.openWithCallback(confirmation_callback, MessageBox, message, MessageBox.TYPE_YESNO)
+        self.session.openWithCallback(kind_selected, ChoiceBox, title="Clear Cache", list=cache_clear_choices())
 
     def keySave(self):
         try:
             save_api_key_to_file()
             save_omdb_api_key_to_file()
             config.plugins.ciefptmdb.cache_enabled.save()
+            config.plugins.ciefptmdb.cache_max_size.save()
+            config.plugins.ciefptmdb.image_upgrade.save()
+            config.plugins.ciefptmdb.progressive_images.save()
+            config.plugins.ciefptmdb.cold_cache_folder.save()
+            config.plugins.ciefptmdb.epg_prefetch.save()
+            config.plugins.ciefptmdb.index_workers.save()
+            config.plugins.ciefptmdb.index_budget.save()
             config.plugins.ciefptmdb.show_imdb_rating.save()
             config.plugins.ciefptmdb.language.save()
             configfile.save()
@@ -3162,8 +5737,43 @@ class SettingsScreen(Screen):
 # ---------- plugin entry ----------
 def main(session, **kwargs):
     session.open(CiefpTMDBMain)
-    
+
+
+WRITE_BACK_INTERVAL = 60 * 60 * 1000  # pozadinski prefetch puni /tmp i kada plugin nije otvoren
+write_back_timer = None
+
+
+def periodic_write_back():
+    if cold_cache_folder():
+        download_pool.submit(write_back_caches, priority=PRIORITY_PREFETCH)
+
+
+def sessionstart(reason, session=None, **kwargs):
+    global epg_prefetcher, bouquet_indexer, write_back_timer
+    if reason == 0 and epg_prefetcher is None:
+        epg_prefetcher = EPGPrefetcher()
+        epg_prefetcher.start()
+        bouquet_indexer = BouquetIndexer()
+        bouquet_indexer.start()
+        write_back_timer = eTimer()
+        write_back_timer.timeout.get().append(periodic_write_back)
+        write_back_timer.start(WRITE_BACK_INTERVAL, False)
+
+
+def autostart(reason, **kwargs):
+    """reason 1 = gašenje enigma2: topli keš iz /tmp ide na disk pre restarta"""
+    if reason != 1:
+        return
+    for worker in (epg_prefetcher, bouquet_indexer):
+        if worker is not None:
+            worker.stop()
+    if cold_cache_folder():
+        write_back_caches()
+
+
 def Plugins(**kwargs):
     icon = PLUGIN_ICON if os.path.exists(PLUGIN_ICON) and LoadPixmap(PLUGIN_ICON) else None
     return [PluginDescriptor(name="{0} v{1}".format(PLUGIN_NAME, PLUGIN_VERSION), description=PLUGIN_DESC, icon=PLUGIN_ICON, where=PluginDescriptor.WHERE_PLUGINMENU, fnc=main),
-        PluginDescriptor(name="{0} v{1}".format(PLUGIN_NAME, PLUGIN_VERSION), where=PluginDescriptor.WHERE_CHANNEL_CONTEXT_MENU, fnc=main)]
\ No newline at end of file
+        PluginDescriptor(name="{0} v{1}".format(PLUGIN_NAME, PLUGIN_VERSION), where=PluginDescriptor.WHERE_CHANNEL_CONTEXT_MENU, fnc=main),
+        PluginDescriptor(where=PluginDescriptor.WHERE_SESSIONSTART, fnc=sessionstart),
+        PluginDescriptor(where=PluginDescriptor.WHERE_AUTOSTART, fnc=autostart)]
\ No newline at end of file